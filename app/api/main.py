@@ -1,10 +1,17 @@
 import asyncio
+import json
 import logging
-from fastapi import FastAPI, Depends
+from typing import Literal, Optional
+from fastapi import FastAPI, Depends, Query
+from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from ..core.pool import ProxyPool
 from ..core.models import Proxy
+from ..core.index import Strategy
+from ..core.anonymity import Anonymity
+from ..core import metrics
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +28,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记录 /proxy 请求耗时
+app.add_middleware(metrics.RequestTimer, paths=("/proxy",))
+
 # 初始化代理池
 proxy_pool = ProxyPool()
 background_tasks = set()
@@ -36,8 +46,8 @@ def get_db():
 @app.on_event("startup")
 async def startup_event():
     try:
-        # 启动代理池后台任务
-        task = asyncio.create_task(proxy_pool.start())
+        # 启动代理池后台任务；多worker时只有一个进程真正爬取和验证
+        task = asyncio.create_task(proxy_pool.serve())
         background_tasks.add(task)
         task.add_done_callback(background_tasks.discard)
         logger.info("代理池后台任务已启动")
@@ -50,29 +60,95 @@ async def shutdown_event():
     for task in background_tasks:
         task.cancel()
     await asyncio.gather(*background_tasks, return_exceptions=True)
+    await proxy_pool.close()
     logger.info("代理池后台任务已停止")
 
+class LeaseReport(BaseModel):
+    lease_id: str
+    result: Literal["release", "success", "failure"] = "release"
+    latency: Optional[float] = None  # 客户端实际观测到的响应时间(秒)
+
 @app.get("/proxy")
-def get_proxy(db: Session = Depends(get_db)):
-    """获取一个代理"""
-    proxy = proxy_pool.get_proxy(db)
+async def get_proxy(strategy: Strategy = Strategy.BEST, count: Optional[int] = Query(None, ge=1, le=1000),
+                    profile: Optional[str] = None, anonymity: Optional[Anonymity] = None,
+                    distinct_egress: bool = False):
+    """获取一个代理；指定count时批量租用多个不重复的代理，指定profile时只返回通过该验证配置的代理
+
+    anonymity 为最低匿名度；distinct_egress 为true时批量租用的代理出口IP各不相同。
+    """
+    if profile is not None and profile not in proxy_pool.profile_indexes:
+        return JSONResponse({"error": f"Unknown profile: {profile}"}, status_code=404)
+    if count is not None:
+        proxies = proxy_pool.lease_proxies(count, strategy, profile, anonymity, distinct_egress)
+        if proxies:
+            return {"ttl": proxy_pool.leases.ttl, "proxies": proxies}
+        return {"error": "No valid proxy available"}
+    proxy = proxy_pool.get_proxy(strategy, profile, anonymity)
     if proxy:
-        return proxy.to_dict()
+        return proxy
     return {"error": "No valid proxy available"}
 
+@app.post("/proxy/report")
+async def report_proxies(reports: list[LeaseReport]):
+    """归还租用的代理或上报使用结果"""
+    accepted = await proxy_pool.report_proxies(
+        [(report.lease_id, report.result, report.latency) for report in reports])
+    return {"accepted": accepted, "ignored": len(reports) - accepted}
+
 @app.get("/proxies")
-def get_proxies(valid_only: bool = True, db: Session = Depends(get_db)):
-    """获取所有代理"""
-    proxies = proxy_pool.get_all_proxies(db, valid_only=valid_only)
-    return [proxy.to_dict() for proxy in proxies]
+def get_proxies(
+    valid_only: bool = True,
+    protocol: Optional[str] = None,
+    source: Optional[str] = None,
+    max_latency: Optional[float] = Query(None, gt=0),
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    format: Literal["json", "ndjson"] = "json",
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    """分页获取代理，按id升序；响应头 X-Next-After-Id 为下一页的 after_id
+
+    stream=true 时从 after_id 开始流式输出全部匹配的代理，不受 limit 限制。
+    """
+    filters = dict(valid_only=valid_only, protocol=protocol, source=source, max_latency=max_latency)
+    if stream:
+        proxies = proxy_pool.iter_proxies(after_id=after_id, **filters)
+        if format == "ndjson":
+            body = (json.dumps(proxy) + "\n" for proxy in proxies)
+            return StreamingResponse(body, media_type="application/x-ndjson")
+        return StreamingResponse(_json_array(proxies), media_type="application/json")
+
+    page = [proxy.to_dict() for proxy in
+            proxy_pool.page_proxies(db, after_id=after_id, limit=limit, **filters)]
+    headers = {"X-Next-After-Id": str(page[-1]["id"])} if len(page) == limit else {}
+    if format == "ndjson":
+        content = "".join(json.dumps(proxy) + "\n" for proxy in page)
+        return Response(content, media_type="application/x-ndjson", headers=headers)
+    return JSONResponse(page, headers=headers)
+
+def _json_array(items):
+    # 逐个输出JSON数组元素，不在内存中拼出整个列表
+    yield "["
+    for i, item in enumerate(items):
+        yield ("," if i else "") + json.dumps(item)
+    yield "]"
 
 @app.get("/stats")
 def get_stats(db: Session = Depends(get_db)):
     """获取代理池统计信息"""
-    all_proxies = proxy_pool.get_all_proxies(db, valid_only=False)
-    valid_proxies = [p for p in all_proxies if p.is_valid]
     return {
-        "total": len(all_proxies),
-        "valid": len(valid_proxies),
-        "success_rate": len(valid_proxies) / len(all_proxies) if all_proxies else 0
-    } 
\ No newline at end of file
+        **proxy_pool.count_proxies(db),
+        **proxy_pool.schedule_stats()
+    }
+
+@app.get("/sources")
+def get_sources():
+    """各代理源地址的抓取耗时、新代理产出、首次验证通过率和当前抓取间隔"""
+    return proxy_pool.source_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
@@ -0,0 +1,71 @@
+"""根据回显服务的响应判断代理的匿名度和出口IP
+
+配置了回显地址(环境变量 PROXY_ECHO_URL)时，默认验证直接请求它，不额外发请求。
+回显服务返回服务端看到的来源地址和请求头，格式与 httpbin 的 /get 相同：
+    {"origin": "1.2.3.4", "headers": {"Via": "1.1 squid", ...}}
+origin 可能是逗号分隔的转发链，最后一个是实际连到服务端的地址，即代理的出口IP。
+
+- transparent: 请求里能看到本机IP，或转发头里带有出口以外的IP
+- anonymous: 隐藏了本机IP，但带有 Via、X-Forwarded-For 等代理头
+- elite: 看不出经过了代理
+"""
+import json
+import re
+from enum import Enum
+from typing import Iterable, Optional
+
+
+class Anonymity(str, Enum):
+    TRANSPARENT = 'transparent'
+    ANONYMOUS = 'anonymous'
+    ELITE = 'elite'
+
+
+# 匿名度由低到高，按"不低于"过滤时比较下标
+LEVELS = (Anonymity.TRANSPARENT.value, Anonymity.ANONYMOUS.value, Anonymity.ELITE.value)
+
+# 会暴露经过了代理的请求头(小写)
+PROXY_HEADERS = ('via', 'forwarded', 'x-forwarded-for', 'x-forwarded-host', 'x-real-ip', 'x-proxy-id',
+                 'proxy-connection', 'client-ip', 'x-client-ip', 'x-originating-ip', 'proxy-client-ip')
+# 其中用来转发客户端地址的
+FORWARD_HEADERS = ('forwarded', 'x-forwarded-for', 'x-real-ip', 'client-ip', 'x-client-ip',
+                   'x-originating-ip', 'proxy-client-ip')
+
+IPV4 = re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}\b')
+
+
+def parse_echo(body: bytes) -> Optional[tuple[list[str], dict]]:
+    """解析回显响应，返回 (来源地址链, 小写的请求头)；不是回显内容时返回None"""
+    try:
+        data = json.loads(body)
+        origin = data['origin']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(origin, str) or not origin:
+        return None
+    headers = data.get('headers') or {}
+    if not isinstance(headers, dict):
+        return None
+    chain = [part.strip() for part in origin.split(',') if part.strip()]
+    return chain, {str(name).lower(): str(value) for name, value in headers.items()}
+
+
+def classify(chain: list[str], headers: dict, real_ips: Iterable[str]) -> tuple[str, str]:
+    """返回 (出口IP, 匿名度)"""
+    egress = chain[-1]
+    real_ips = set(real_ips)
+    values = [headers[name] for name in PROXY_HEADERS if name in headers]
+    if real_ips & set(chain) or any(ip in value for ip in real_ips for value in values):
+        return egress, Anonymity.TRANSPARENT.value
+    # 没拿到本机IP时，转发头里出现出口以外的地址同样按透明处理
+    forwarded = {ip for name in FORWARD_HEADERS if name in headers for ip in IPV4.findall(headers[name])}
+    if forwarded - {egress} or len(chain) > 1:
+        return egress, Anonymity.TRANSPARENT.value
+    if values:
+        return egress, Anonymity.ANONYMOUS.value
+    return egress, Anonymity.ELITE.value
+
+
+def at_least(level: Optional[str], minimum: str) -> bool:
+    """level 是否不低于 minimum，未检测过的(None)不满足任何要求"""
+    return level is not None and LEVELS.index(level) >= LEVELS.index(minimum)
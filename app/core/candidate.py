@@ -0,0 +1,93 @@
+"""爬取、排队和验证过程中使用的轻量代理记录
+
+ORM 的 Proxy 实例带有实例状态和属性字典，每个要占用上KB内存；一轮爬取动辄几十万行，
+绝大多数验证后就被丢弃。这里用 __slots__ 记录同样的字段，只在写库时转换成表的行。
+另外记录爬到它的列表地址(origin)，用于统计各代理源的产出，不写入数据库；
+health 为各验证配置下的检查结果(profiles.py)，没有配置时为None。
+"""
+import socket
+from datetime import datetime
+from typing import Iterable
+from .models import Proxy
+
+# 与表的列顺序一致，from_row 按位置赋值
+FIELDS = tuple(column.name for column in Proxy.__table__.columns)
+
+PROTOCOL_CODES = {'http': 0, 'https': 1, 'socks4': 2, 'socks5': 3}
+
+
+def pack_key(host: str, port: int, protocol: str) -> int:
+    """把 (IPv4, 端口, 协议) 打包成一个整数，去重用的集合比元组小得多"""
+    ip = int.from_bytes(socket.inet_aton(host), 'big')
+    return (ip << 19) | (port << 3) | PROTOCOL_CODES[protocol]
+
+
+class ProxyCandidate:
+    __slots__ = FIELDS + ('origin', 'health')
+
+    def __init__(self, host: str, port: int, protocol: str, source: str = None, origin: str = None):
+        self.origin = origin
+        self.health = None
+        self.id = None
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.source = source
+        self.last_check = None
+        self.response_time = None
+        self.is_valid = None
+        self.fail_count = 0
+        self.success_rate = None
+        self.latency_ewma = None
+        self.latency_var = None
+        self.check_count = 0
+        self.score = None
+        self.anonymity = None
+        self.egress_ip = None
+
+    @classmethod
+    def from_row(cls, row: Iterable) -> 'ProxyCandidate':
+        # row 是按 FIELDS 顺序查询出的一行
+        candidate = cls.__new__(cls)
+        candidate.origin = None
+        candidate.health = None
+        for name, value in zip(FIELDS, row):
+            setattr(candidate, name, value)
+        return candidate
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ProxyCandidate':
+        # to_dict 的逆操作，用于从索引快照恢复
+        candidate = cls(data['host'], data['port'], data['protocol'], data.get('source'))
+        for name in FIELDS:
+            if name in data and name != 'last_check':
+                setattr(candidate, name, data[name])
+        if data.get('last_check'):
+            candidate.last_check = datetime.fromisoformat(data['last_check'])
+        return candidate
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'host': self.host,
+            'port': self.port,
+            'protocol': self.protocol,
+            'last_check': self.last_check.isoformat() if self.last_check else None,
+            'response_time': self.response_time,
+            'is_valid': self.is_valid,
+            'fail_count': self.fail_count,
+            'source': self.source,
+            'success_rate': self.success_rate,
+            'latency_ewma': self.latency_ewma,
+            'check_count': self.check_count,
+            'score': self.score,
+            'anonymity': self.anonymity,
+            'egress_ip': self.egress_ip
+        }
+
+    @property
+    def url(self):
+        return f"{self.protocol}://{self.host}:{self.port}"
+
+    def __repr__(self):
+        return f"ProxyCandidate({self.url})"
@@ -1,89 +1,117 @@
 import asyncio
-import re
 import logging
 import json
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional, Tuple
 import aiohttp
-import chardet
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
-from .models import Proxy
+from .candidate import ProxyCandidate, pack_key
+from .parser import IPV4_PATTERN, decode_content, parse_ip_port
+from .metrics import SOURCE_FETCH_SECONDS, SOURCE_FETCHES, SOURCE_PROXIES, PARSE_SECONDS
+from .sources import SourceTracker
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 
 class ProxyCrawler:
-    def __init__(self):
+    def __init__(self, timeout: int = 30, limit: int = 100):
         self.ua = UserAgent()
+        self.timeout = timeout
+        self.limit = limit
+        self._session: Optional[aiohttp.ClientSession] = None
+        # url -> {'etag', 'last_modified', 'proxies'}，用于条件请求
+        self._page_cache: Dict[str, Dict] = {}
+        self._pending_validators: Dict[str, tuple] = {}
+        # 各地址的产出统计，决定每个地址多久抓取一次
+        self.tracker = SourceTracker()
+        # 每个地址对应的协议；None表示列表内容自带协议(带scheme的行或JSON字段)，缺省按http处理
         self.sources = {
             # GitHub代理列表
             'proxylist': {
-                'urls': [
-                    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt',
-                    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks4.txt',
-                    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks5.txt'
-                ],
+                'urls': {
+                    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt': 'http',
+                    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks4.txt': 'socks4',
+                    'https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks5.txt': 'socks5'
+                },
                 'parser': self.parse_proxylist
             },
             'monosans': {
-                'urls': [
-                    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/http.txt',
-                    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks4.txt',
-                    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks5.txt'
-                ],
+                'urls': {
+                    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/http.txt': 'http',
+                    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks4.txt': 'socks4',
+                    'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks5.txt': 'socks5'
+                },
                 'parser': self.parse_proxylist
             },
             'prxchk': {
-                'urls': [
-                    'https://raw.githubusercontent.com/prxchk/proxy-list/main/http.txt',
-                    'https://raw.githubusercontent.com/prxchk/proxy-list/main/socks4.txt',
-                    'https://raw.githubusercontent.com/prxchk/proxy-list/main/socks5.txt'
-                ],
+                'urls': {
+                    'https://raw.githubusercontent.com/prxchk/proxy-list/main/http.txt': 'http',
+                    'https://raw.githubusercontent.com/prxchk/proxy-list/main/socks4.txt': 'socks4',
+                    'https://raw.githubusercontent.com/prxchk/proxy-list/main/socks5.txt': 'socks5'
+                },
                 'parser': self.parse_proxylist
             },
             'hookzof': {
-                'urls': [
-                    'https://raw.githubusercontent.com/hookzof/socks5_list/master/proxy.txt',
-                ],
+                'urls': {
+                    'https://raw.githubusercontent.com/hookzof/socks5_list/master/proxy.txt': 'socks5',
+                },
                 'parser': self.parse_proxylist
             },
             'rdavydov': {
-                'urls': [
-                    'https://raw.githubusercontent.com/rdavydov/proxy-list/main/proxies/http.txt',
-                    'https://raw.githubusercontent.com/rdavydov/proxy-list/main/proxies/socks4.txt',
-                    'https://raw.githubusercontent.com/rdavydov/proxy-list/main/proxies/socks5.txt'
-                ],
+                'urls': {
+                    'https://raw.githubusercontent.com/rdavydov/proxy-list/main/proxies/http.txt': 'http',
+                    'https://raw.githubusercontent.com/rdavydov/proxy-list/main/proxies/socks4.txt': 'socks4',
+                    'https://raw.githubusercontent.com/rdavydov/proxy-list/main/proxies/socks5.txt': 'socks5'
+                },
                 'parser': self.parse_proxylist
             },
             'jetkai': {
-                'urls': [
-                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-http.txt',
-                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-https.txt',
-                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-socks4.txt',
-                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-socks5.txt'
-                ],
+                'urls': {
+                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-http.txt': 'http',
+                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-https.txt': 'https',
+                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-socks4.txt': 'socks4',
+                    'https://raw.githubusercontent.com/jetkai/proxy-list/main/online-proxies/txt/proxies-socks5.txt': 'socks5'
+                },
                 'parser': self.parse_proxylist
             },
             'proxyscrape': {
-                'urls': [
-                    'https://api.proxyscrape.com/v2/?request=getproxies&protocol=http&timeout=10000&country=all&ssl=all&anonymity=all',
-                    'https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks4&timeout=10000&country=all',
-                    'https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks5&timeout=10000&country=all'
-                ],
+                'urls': {
+                    'https://api.proxyscrape.com/v2/?request=getproxies&protocol=http&timeout=10000&country=all&ssl=all&anonymity=all': 'http',
+                    'https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks4&timeout=10000&country=all': 'socks4',
+                    'https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks5&timeout=10000&country=all': 'socks5'
+                },
                 'parser': self.parse_proxylist
             },
             'proxyspace': {
-                'urls': ['https://api.proxyscrape.com/v3/free-proxy-list/get?request=displayproxies&protocol=all&timeout=10000&proxy_format=ipport&format=text'],
+                # 混合协议列表，使用protocolipport格式让每行带上协议
+                'urls': {'https://api.proxyscrape.com/v3/free-proxy-list/get?request=displayproxies&protocol=all&timeout=10000&proxy_format=protocolipport&format=text': None},
                 'parser': self.parse_proxylist
             },
             'geonode': {
-                'urls': ['https://proxylist.geonode.com/api/proxy-list?limit=500&page=1&sort_by=lastChecked&sort_type=desc&protocols=http%2Chttps%2Csocks4%2Csocks5&anonymityLevel=elite&anonymityLevel=anonymous'],
+                'urls': {'https://proxylist.geonode.com/api/proxy-list?limit=500&page=1&sort_by=lastChecked&sort_type=desc&protocols=http%2Chttps%2Csocks4%2Csocks5&anonymityLevel=elite&anonymityLevel=anonymous': None},
                 'parser': self.parse_geonode
             }
         }
 
-    async def fetch_page(self, url: str) -> str:
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 所有代理源共用一个会话，复用连接(多数源都在raw.githubusercontent.com上)
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300, ssl=False)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def fetch_page(self, url: str) -> Optional[str]:
+        """获取页面内容；页面自上次抓取后未变化(304)时返回None，出错时返回空字符串"""
         headers = {
             'User-Agent': self.ua.random,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -93,60 +121,76 @@ class ProxyCrawler:
             'Pragma': 'no-cache',
             'Upgrade-Insecure-Requests': '1'
         }
+        # 已有解析结果时带上条件请求头，源未更新就不必重新下载和解析
+        cached = self._page_cache.get(url)
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=30, ssl=False) as response:
-                    if response.status == 200:
-                        content = await response.read()
-                        # 检测编码
-                        encoding = chardet.detect(
-                            content)['encoding'] or 'utf-8'
-                        html = content.decode(encoding, errors='ignore')
-                        logger.debug(f"成功获取页面: {url}")
-                        return html
-                    else:
-                        logger.warning(f"获取页面失败 {url}, 状态码: {response.status}")
-                        return ''
+            session = self._get_session()
+            async with session.get(url, headers=headers, ssl=False) as response:
+                if response.status == 304 and cached is not None:
+                    logger.debug(f"页面未变化: {url}")
+                    return None
+                if response.status == 200:
+                    content = await response.read()
+                    html = decode_content(content)
+                    self._pending_validators[url] = (
+                        response.headers.get('ETag'),
+                        response.headers.get('Last-Modified')
+                    )
+                    logger.debug(f"成功获取页面: {url}")
+                    return html
+                else:
+                    logger.warning(f"获取页面失败 {url}, 状态码: {response.status}")
+                    return ''
         except Exception as e:
             logger.error(f"获取页面出错 {url}: {str(e)}")
             return ''
 
-    def parse_proxylist(self, content: str) -> List[Dict]:
-        proxies = []
-        if not content:
+    async def crawl_url(self, source_name: str, url: str) -> List[Tuple[str, int, str]]:
+        """抓取并解析单个地址，页面未变化时直接复用上次的解析结果"""
+        source_info = self.sources[source_name]
+        start = time.perf_counter()
+        page = await self.fetch_page(url)
+        fetch_seconds = time.perf_counter() - start
+        SOURCE_FETCH_SECONDS.observe(fetch_seconds, source_name)
+        if page is None:
+            SOURCE_FETCHES.inc(source_name, 'not_modified')
+            proxies = self._page_cache[url]['proxies']
+            SOURCE_PROXIES.inc(source_name, amount=len(proxies))
+            self.tracker.record_fetch(source_name, url, 'not_modified', fetch_seconds, len(proxies))
             return proxies
-        try:
-            for line in content.splitlines():
-                try:
-                    if not line or ':' not in line:
-                        continue
-                    parts = line.strip().split(':')
-                    if len(parts) >= 2:
-                        host = parts[0]
-                        port = int(parts[1])
-                        # 根据URL判断协议类型
-                        protocol = 'http'
-                        if 'socks4' in line.lower():
-                            protocol = 'socks4'
-                        elif 'socks5' in line.lower():
-                            protocol = 'socks5'
-                        elif 'https' in line.lower():
-                            protocol = 'https'
+        if not page:
+            SOURCE_FETCHES.inc(source_name, 'error')
+            self.tracker.record_fetch(source_name, url, 'error', fetch_seconds, 0)
+            return []
+        SOURCE_FETCHES.inc(source_name, 'ok')
+        with PARSE_SECONDS.time(source_name):
+            proxies = source_info['parser'](page, source_info['urls'].get(url))
+        SOURCE_PROXIES.inc(source_name, amount=len(proxies))
+        self.tracker.record_fetch(source_name, url, 'ok', fetch_seconds, len(proxies))
+        etag, last_modified = self._pending_validators.pop(url, (None, None))
+        if etag or last_modified:
+            self._page_cache[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'proxies': proxies
+            }
+        else:
+            self._page_cache.pop(url, None)
+        return proxies
 
-                        if self._validate_proxy_format(host, port, protocol):
-                            proxies.append({
-                                'host': host,
-                                'port': port,
-                                'protocol': protocol,
-                                'source': 'proxylist'
-                            })
-                except:
-                    continue
+    def parse_proxylist(self, content: str, protocol: Optional[str] = None) -> List[Tuple[str, int, str]]:
+        try:
+            return parse_ip_port(content, protocol or 'http')
         except Exception as e:
             logger.error(f"解析proxylist代理失败: {str(e)}")
-        return proxies
+            return []
 
-    def parse_geonode(self, content: str) -> List[Dict]:
+    def parse_geonode(self, content: str, protocol: Optional[str] = None) -> List[Tuple[str, int, str]]:
         proxies = []
         if not content:
             return proxies
@@ -158,12 +202,7 @@ class ProxyCrawler:
                     port = int(item.get('port'))
                     protocol = item.get('protocols', ['http'])[0].lower()
                     if self._validate_proxy_format(host, port, protocol):
-                        proxies.append({
-                            'host': host,
-                            'port': port,
-                            'protocol': protocol,
-                            'source': 'geonode'
-                        })
+                        proxies.append((host, port, protocol))
                 except:
                     continue
         except Exception as e:
@@ -172,8 +211,7 @@ class ProxyCrawler:
 
     def _validate_proxy_format(self, host: str, port: int, protocol: str) -> bool:
         try:
-            ip_pattern = r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-            if not re.match(ip_pattern, host):
+            if not IPV4_PATTERN.match(host):
                 return False
             if not (0 <= port <= 65535):
                 return False
@@ -184,56 +222,40 @@ class ProxyCrawler:
             logger.error(f"验证代理格式失败: {str(e)}")
             return False
 
-    async def crawl(self) -> List[Proxy]:
+    async def crawl(self, force: bool = True) -> List[ProxyCandidate]:
+        """抓取所有代理源；force 为 False 时只抓取按产出统计已到期的地址"""
         logger.info("开始爬取代理...")
-        all_proxies = []
-        tasks = []
+        unique_proxies = []
+        # 去重用打包后的整数key，同一地址的不同协议视为不同代理；重复的行不创建对象
+        seen = set()
 
-        # 创建爬取任务
+        # 所有地址并发抓取，总耗时约等于最慢的那个源
+        now = time.time()
+        tasks = []
         for source_name, source_info in self.sources.items():
             for url in source_info['urls']:
-                tasks.append((source_name, url, self.fetch_page(url)))
+                if force or self.tracker.due(url, now):
+                    tasks.append((source_name, url))
+        results = await asyncio.gather(
+            *(self.crawl_url(source_name, url) for source_name, url in tasks),
+            return_exceptions=True
+        )
 
-        # 并发爬取页面
-        results = []
-        for source_name, url, task in tasks:
-            try:
-                page = await task
-                results.append((source_name, page))
-            except Exception as e:
-                logger.error(f"爬取 {source_name} ({url}) 失败: {str(e)}")
+        page_count = 0
+        for (source_name, url), proxies in zip(tasks, results):
+            if isinstance(proxies, Exception):
+                logger.error(f"爬取 {source_name} ({url}) 失败: {str(proxies)}")
                 continue
-
-        logger.info(f"完成页面爬取，获取到 {len(results)} 个页面")
-
-        # 解析页面
-        for source_name, page in results:
-            if not page:
+            if not proxies:
                 continue
-            try:
-                source_info = self.sources[source_name]
-                proxies = source_info['parser'](page)
-                if proxies:
-                    logger.info(f"从 {source_name} 解析到 {len(proxies)} 个代理")
-                    for proxy_dict in proxies:
-                        proxy = Proxy(
-                            host=proxy_dict['host'],
-                            port=proxy_dict['port'],
-                            protocol=proxy_dict['protocol'],
-                            source=source_name
-                        )
-                        all_proxies.append(proxy)
-            except Exception as e:
-                logger.error(f"解析 {source_name} 代理失败: {str(e)}")
-
-        # 去重
-        unique_proxies = []
-        seen = set()
-        for proxy in all_proxies:
-            key = f"{proxy.host}:{proxy.port}"
-            if key not in seen:
-                seen.add(key)
-                unique_proxies.append(proxy)
+            page_count += 1
+            logger.info(f"从 {source_name} 解析到 {len(proxies)} 个代理")
+            for host, port, protocol in proxies:
+                key = pack_key(host, port, protocol)
+                if key not in seen:
+                    seen.add(key)
+                    unique_proxies.append(ProxyCandidate(host, port, protocol, source_name, url))
 
+        logger.info(f"完成页面爬取，抓取 {len(tasks)} 个地址，{page_count} 个页面有代理")
         logger.info(f"爬取完成，共获取到 {len(unique_proxies)} 个唯一代理")
         return unique_proxies
@@ -0,0 +1,470 @@
+import random
+import threading
+from datetime import timezone
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import chain, islice
+from enum import Enum
+from typing import Callable, Iterable, Iterator, Optional
+from .models import Proxy
+from .scoring import score_of
+
+
+class Strategy(str, Enum):
+    BEST = 'best'                # 分数最优
+    ROUND_ROBIN = 'round_robin'  # 按排名轮询
+    WEIGHTED = 'weighted'        # 按分数倒数加权随机
+    LRU = 'lru'                  # 最久未被分配的
+    P2C = 'p2c'                  # 随机取两个，选分配次数少的
+
+
+# 随机类策略带过滤条件时至少尝试的次数
+MIN_ATTEMPTS = 32
+
+
+def proxy_key(proxy) -> tuple:
+    return (proxy.host, proxy.port, proxy.protocol)
+
+
+def proxy_score(proxy) -> float:
+    # 分数越小越优先
+    return score_of(proxy)
+
+
+def _weight(score: float) -> float:
+    return 1.0 / max(score, 0.001)
+
+
+def checked_at(proxy) -> float:
+    # last_check 存的是不带时区的UTC时间
+    return proxy.last_check.replace(tzinfo=timezone.utc).timestamp() if proxy.last_check else 0.0
+
+
+class _Entry:
+    __slots__ = ('score', 'data', 'slot', 'handed', 'checked')
+
+    def __init__(self, score: float, data: dict, handed: int = 0, checked: float = 0.0):
+        self.score = score
+        self.data = data
+        self.slot = -1
+        self.handed = handed
+        self.checked = checked
+
+
+class _FenwickTree:
+    """按槽位存权重的树状数组，支持 O(log n) 更新和按前缀和抽样"""
+
+    def __init__(self, capacity: int = 1024):
+        self.tree = [0.0] * (capacity + 1)
+
+    @classmethod
+    def build(cls, weights: list, capacity: int) -> '_FenwickTree':
+        # O(n) 建树：每个节点把自己的和累加到父节点
+        fenwick = cls(capacity)
+        tree = fenwick.tree
+        tree[1:len(weights) + 1] = weights
+        size = len(tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def add(self, slot: int, delta: float):
+        i = slot + 1
+        size = len(self.tree)
+        while i < size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self, count: int) -> float:
+        i, result = count, 0.0
+        while i > 0:
+            result += self.tree[i]
+            i -= i & -i
+        return result
+
+    def find(self, value: float, count: int) -> int:
+        # 返回前缀和首次超过 value 的槽位
+        pos, step = 0, 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self.tree) and self.tree[nxt] <= value:
+                pos = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        return min(pos, count - 1)
+
+
+class ProxyIndex:
+    """内存中的有效代理排序索引，/proxy 直接从这里取，不访问数据库
+
+    _ranked 按 (分数, key) 升序保存，用于最优和轮询；_slots 是紧凑数组，
+    配合树状数组支持均匀/加权随机抽样；_lru 记录分配顺序。
+    不带过滤条件时各策略选一个代理是 O(1) 或 O(log n)；带过滤条件时逐个尝试候选，
+    LRU 还要复制分配顺序，最坏 O(n)。更新和移除要在 _ranked 列表中插入/删除，是 O(n)，
+    但只是一次内存移动，十万个代理时一次更新约几十微秒。写入和读取可能来自不同线程，因此用锁保护。
+
+    指定 profile 时只收录在该验证配置下最近一次检查通过的代理，按该配置下的分数排序。
+    """
+
+    def __init__(self, seed: int = None, profile: str = None):
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        # 每次内容变化加一，写快照时据此判断是否需要重写
+        self.version = 0
+        # 后台补齐快照期间记录已变化的key(见 track_changes)，不在补齐时为None
+        self._touched: Optional[set] = None
+        self._extend_cutoff = 0.0
+        # 上次 take_changes 之后变化过的key，用于增量写快照；需要写完整快照时为None
+        self._changed: Optional[dict] = None
+        self._reset({})
+
+    def _reset(self, entries: dict):
+        self._apply(self._build(entries, list(getattr(self, '_lru', ()))))
+
+    @staticmethod
+    def _build(entries: dict, previous_lru: list) -> tuple:
+        """由全部条目构造排名、槽位、权重树和分配顺序，不访问索引当前状态，可以在锁外执行"""
+        ranked = sorted((entry.score, key) for key, entry in entries.items())
+        slots = list(entries)
+        capacity = 1024
+        while capacity <= len(entries):
+            capacity *= 2
+        for slot, entry in enumerate(entries.values()):
+            entry.slot = slot
+        weights = _FenwickTree.build([_weight(entry.score) for entry in entries.values()], capacity)
+        # 新加入的(从未分配过)排在前面，其余保持原来的分配先后顺序
+        previous = set(previous_lru)
+        lru = OrderedDict.fromkeys(chain(
+            (key for key in entries if key not in previous),
+            (key for key in previous_lru if key in entries)))
+        return entries, ranked, slots, weights, lru
+
+    def _apply(self, state: tuple):
+        self._entries, self._ranked, self._slots, self._weights, self._lru = state
+        self._cursor = 0
+
+    def _replace(self, entries: dict, previous_lru: list):
+        # 新状态在锁外构造好，加锁只做替换，整体替换期间 /proxy 不会被阻塞
+        state = self._build(entries, previous_lru)
+        with self._lock:
+            self.version += 1
+            # 整体替换后，正在后台补齐的旧快照内容不再需要，下次也要写完整快照
+            self._touched = None
+            self._changed = None
+            self._apply(state)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add_slot(self, key: tuple, entry: _Entry):
+        if len(self._slots) + 1 >= len(self._weights.tree):
+            # 容量不足时整体扩容重建
+            self._slots.append(key)
+            entry.slot = len(self._slots) - 1
+            self._weights = _FenwickTree(2 * len(self._weights.tree))
+            for slot, slot_key in enumerate(self._slots):
+                self._weights.add(slot, _weight(self._entries[slot_key].score))
+            return
+        self._slots.append(key)
+        entry.slot = len(self._slots) - 1
+        self._weights.add(entry.slot, _weight(entry.score))
+
+    def _remove_slot(self, entry: _Entry):
+        # 用最后一个槽位填补空位，保持数组紧凑
+        slot = entry.slot
+        last = len(self._slots) - 1
+        self._weights.add(slot, -_weight(entry.score))
+        if slot != last:
+            moved_key = self._slots[last]
+            moved = self._entries[moved_key]
+            w = _weight(moved.score)
+            self._weights.add(last, -w)
+            self._weights.add(slot, w)
+            self._slots[slot] = moved_key
+            moved.slot = slot
+        self._slots.pop()
+
+    def _discard(self, key: tuple, keep_lru: bool = False) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._remove_slot(entry)
+        del self._entries[key]
+        if not keep_lru:
+            self._lru.pop(key, None)
+        pos = bisect_left(self._ranked, (entry.score, key))
+        if pos < len(self._ranked) and self._ranked[pos][1] == key:
+            del self._ranked[pos]
+        return entry
+
+    def _score_and_data(self, proxy: Proxy) -> Optional[tuple]:
+        """返回 (分数, 代理数据)，不应收录时返回None"""
+        if not proxy.is_valid:
+            return None
+        if self.profile is None:
+            return proxy_score(proxy), proxy.to_dict()
+        health = (getattr(proxy, 'health', None) or {}).get(self.profile)
+        if health is None or not health.ok:
+            return None
+        return score_of(health), dict(proxy.to_dict(), **health.to_dict())
+
+    def _set(self, key: tuple, score: Optional[float], data: Optional[dict], checked: float):
+        # 插入、移动或删除(score 为None)一个代理，调用方持锁
+        if self._touched is not None:
+            self._touched.add(key)
+        if self._changed is not None:
+            self._changed[key] = None
+        # 重新验证不算分配，保留它在 _lru 中的位置
+        old = self._discard(key, keep_lru=True)
+        if score is None:
+            self._lru.pop(key, None)
+            return
+        entry = _Entry(score, data, old.handed if old else 0, checked)
+        self._entries[key] = entry
+        insort(self._ranked, (score, key))
+        self._add_slot(key, entry)
+        if old is None:
+            self._lru[key] = None
+            self._lru.move_to_end(key, last=False)
+
+    def update(self, proxy: Proxy):
+        """根据最新验证结果插入、移动或删除一个代理"""
+        key = proxy_key(proxy)
+        score, data = self._score_and_data(proxy) or (None, None)
+        with self._lock:
+            self.version += 1
+            self._set(key, score, data, checked_at(proxy))
+
+    def rebuild(self, proxies: Iterable[Proxy]):
+        """用一批有效代理整体替换索引，保留已有代理的分配次数"""
+        entries = {}
+        with self._lock:
+            previous = self._entries
+            lru = list(self._lru)
+        for proxy in proxies:
+            values = self._score_and_data(proxy)
+            if values is not None:
+                key = proxy_key(proxy)
+                old = previous.get(key)
+                entries[key] = _Entry(values[0], values[1], old.handed if old else 0, checked_at(proxy))
+        self._replace(entries, lru)
+
+    def dump(self) -> list[list]:
+        """按排名导出 [分数, 最后检查时间, 代理数据]，用于写快照
+
+        条目更新时整体替换、不原地修改，锁内只取引用，构造记录在锁外进行。
+        """
+        with self._lock:
+            ranked = [(score, self._entries[key]) for score, key in self._ranked]
+        return [[score, entry.checked, entry.data] for score, entry in ranked]
+
+    def restore(self, records: Iterable[list]):
+        """用 dump 导出的记录整体替换索引，保留已有代理的分配次数
+
+        耗时的部分都在锁外，可以在线程中调用；构造期间发生的分配不计入新状态的顺序。
+        """
+        entries = {}
+        with self._lock:
+            previous = self._entries
+            lru = list(self._lru)
+        for score, checked, data in records:
+            key = (data['host'], data['port'], data['protocol'])
+            old = previous.get(key)
+            entries[key] = _Entry(score, data, old.handed if old else 0, checked)
+        self._replace(entries, lru)
+
+    def take_changes(self) -> Optional[list]:
+        """返回上次调用之后变化过的代理 [分数, 最后检查时间, 代理数据]，已移除的分数为None
+
+        第一次调用或期间索引被整体替换过时返回None，此时应写完整快照。
+        """
+        with self._lock:
+            changed, self._changed = self._changed, {}
+            if changed is None:
+                return None
+            records = []
+            for key in changed:
+                entry = self._entries.get(key)
+                if entry is None:
+                    records.append([None, None, {'host': key[0], 'port': key[1], 'protocol': key[2]}])
+                else:
+                    records.append([entry.score, entry.checked, entry.data])
+            return records
+
+    def apply_changes(self, records: Iterable[list], chunk_size: int = 500):
+        """应用 take_changes 导出的变化记录，分块加锁，可以在线程中调用"""
+        records = iter(records)
+        while chunk := list(islice(records, chunk_size)):
+            with self._lock:
+                self.version += 1
+                for score, checked, data in chunk:
+                    self._set((data['host'], data['port'], data['protocol']), score, data, checked)
+
+    def discard(self, key: tuple) -> bool:
+        """移除一个代理，不在索引中时返回False"""
+        with self._lock:
+            if self._touched is not None:
+                self._touched.add(key)
+            if key not in self._entries:
+                return False
+            self.version += 1
+            self._set(key, None, None, 0.0)
+        return True
+
+    def remove_checked_before(self, cutoff: float) -> int:
+        """移除最后检查时间早于 cutoff 的代理，返回移除数量"""
+        with self._lock:
+            if self._touched is not None:
+                self._extend_cutoff = max(self._extend_cutoff, cutoff)
+            stale = [key for key, entry in self._entries.items() if entry.checked < cutoff]
+            for key in stale:
+                self._set(key, None, None, 0.0)
+            if stale:
+                self.version += 1
+        return len(stale)
+
+    def track_changes(self):
+        """开始记录更新和移除过的代理，之后的 extend 跳过它们，不会用旧快照覆盖新结果"""
+        with self._lock:
+            self._touched = set()
+            self._extend_cutoff = 0.0
+
+    def extend(self, records: Iterable[list], chunk_size: int = 2000) -> bool:
+        """加入快照记录中索引里还没有的代理，已有的保持不变
+
+        分块加锁，加载大快照期间 /proxy 仍可正常响应。跳过 track_changes 之后更新或移除过的代理；
+        期间索引被 rebuild/restore 整体替换时停止，返回False。
+        """
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            with self._lock:
+                touched = self._touched
+                if touched is None:
+                    return False
+                if not chunk:
+                    self._touched = None
+                    return True
+                self.version += 1
+                for score, checked, data in chunk:
+                    key = (data['host'], data['port'], data['protocol'])
+                    if key in self._entries or key in touched or checked < self._extend_cutoff:
+                        continue
+                    if self._changed is not None:
+                        self._changed[key] = None
+                    entry = _Entry(score, data, 0, checked)
+                    self._entries[key] = entry
+                    insort(self._ranked, (score, key))
+                    self._add_slot(key, entry)
+                    self._lru[key] = None
+                    self._lru.move_to_end(key, last=False)
+
+    def checked_before(self, cutoff: float) -> list[tuple]:
+        """返回最后检查时间早于 cutoff 的 [(检查时间, 代理数据)]"""
+        with self._lock:
+            return [(entry.checked, entry.data) for entry in self._entries.values() if entry.checked < cutoff]
+
+    def staleness(self, now: float) -> dict:
+        """当前可分配代理距上次检查的时间分布(秒)"""
+        with self._lock:
+            ages = sorted(now - entry.checked for entry in self._entries.values())
+        if not ages:
+            return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {
+            'mean': round(sum(ages) / len(ages), 1),
+            'p50': round(ages[len(ages) // 2], 1),
+            'p95': round(ages[min(len(ages) - 1, int(len(ages) * 0.95))], 1),
+            'max': round(ages[-1], 1),
+        }
+
+    def best(self) -> Optional[dict]:
+        return self.select(Strategy.BEST)
+
+    def select(self, strategy: Strategy = Strategy.BEST,
+               accept: Callable[[dict], bool] = None) -> Optional[dict]:
+        """按策略选一个代理；accept 按代理数据过滤，没有满足条件的代理时返回None"""
+        with self._lock:
+            if not self._ranked:
+                return None
+            if accept is None:
+                key = self._pick(strategy)
+            else:
+                key = next((key for key in self._candidates(strategy, 1)
+                            if accept(self._entries[key].data)), None)
+                if key is None:
+                    return None
+            entry = self._entries[key]
+            entry.handed += 1
+            self._lru.move_to_end(key)
+            return entry.data
+
+    def select_many(self, count: int, strategy: Strategy = Strategy.BEST,
+                    accept: Callable[[dict], bool] = None, distinct_egress: bool = False) -> list[tuple]:
+        """按策略一次选出最多 count 个不重复的代理，返回 [(key, data)]
+
+        distinct_egress 为True时每个出口IP只选一个(未检测出口的按代理地址算)。
+        """
+        with self._lock:
+            count = min(count, len(self._ranked))
+            if strategy == Strategy.BEST and accept is None and not distinct_egress:
+                keys = [key for _, key in self._ranked[:count]]
+            else:
+                keys, seen, egress = [], set(), set()
+                for key in self._candidates(strategy, count):
+                    if len(keys) >= count:
+                        break
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    data = self._entries[key].data
+                    if accept is not None and not accept(data):
+                        continue
+                    if distinct_egress:
+                        ip = data.get('egress_ip') or data['host']
+                        if ip in egress:
+                            continue
+                        egress.add(ip)
+                    keys.append(key)
+            result = []
+            for key in keys:
+                entry = self._entries[key]
+                entry.handed += 1
+                self._lru.move_to_end(key)
+                result.append((key, entry.data))
+            return result
+
+    def _candidates(self, strategy: Strategy, count: int) -> Iterator[tuple]:
+        """按策略依次给出候选代理，可能重复，最后按排名给出全部代理"""
+        ranked = (key for _, key in self._ranked)
+        if strategy == Strategy.BEST:
+            return ranked
+        if strategy == Strategy.LRU:
+            return iter(list(self._lru))
+        # 随机类策略可能重复命中或不满足过滤条件，限制尝试次数后按排名补齐
+        attempts = max(count * 4, MIN_ATTEMPTS)
+        if strategy == Strategy.ROUND_ROBIN:
+            attempts = len(self._ranked)
+        return chain((self._pick(strategy) for _ in range(attempts)), ranked)
+
+    def _pick(self, strategy: Strategy) -> tuple:
+        if strategy == Strategy.ROUND_ROBIN:
+            if self._cursor >= len(self._ranked):
+                self._cursor = 0
+            key = self._ranked[self._cursor][1]
+            self._cursor += 1
+            return key
+        if strategy == Strategy.WEIGHTED:
+            count = len(self._slots)
+            value = self._random.random() * self._weights.total(count)
+            return self._slots[self._weights.find(value, count)]
+        if strategy == Strategy.LRU:
+            return next(iter(self._lru))
+        if strategy == Strategy.P2C:
+            first = self._slots[self._random.randrange(len(self._slots))]
+            second = self._slots[self._random.randrange(len(self._slots))]
+            a, b = self._entries[first], self._entries[second]
+            return first if (a.handed, a.score) <= (b.handed, b.score) else second
+        return self._ranked[0][1]
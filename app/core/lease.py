@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+
+def load_secret(path: str) -> str:
+    """读取租约签名密钥，文件不存在时生成一个；多个worker同时启动时调用方需持有初始化锁"""
+    try:
+        with open(path) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    secret = secrets.token_hex(16)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secret)
+    return secret
+
+
+class LeaseManager:
+    """记录批量分配出去的代理租约，客户端凭 lease_id 归还或上报结果
+
+    指定 secret 时租约ID是带签名的自描述令牌，多个worker共用同一个secret，
+    任一worker都能处理其他worker发出的租约；否则租约只记录在本进程内存中。
+    """
+
+    def __init__(self, ttl: int = 300, secret: str = None):
+        self.ttl = ttl
+        self._secret = secret.encode() if secret else None
+        self._lock = threading.Lock()
+        # lease_id -> (代理key, 过期时间)；签名模式下记录已结束的租约，防止重复上报
+        self._leases: dict[str, tuple] = {}
+        self._next_purge = 0.0
+
+    def __len__(self):
+        return len(self._leases)
+
+    def grant(self, key: tuple) -> tuple[str, float]:
+        now = time.time()
+        expires_at = now + self.ttl
+        if self._secret is not None:
+            return self._sign(key, expires_at), expires_at
+        lease_id = secrets.token_hex(8)
+        with self._lock:
+            self._leases[lease_id] = (key, expires_at)
+            if now >= self._next_purge:
+                self._purge(now)
+        return lease_id, expires_at
+
+    def release(self, lease_id: str) -> Optional[tuple]:
+        """结束租约并返回对应的代理key，租约不存在或已过期时返回None"""
+        now = time.time()
+        if self._secret is not None:
+            lease = self._verify(lease_id)
+            with self._lock:
+                if lease is None or lease_id in self._leases:
+                    return None
+                self._leases[lease_id] = lease
+                if now >= self._next_purge:
+                    self._purge(now)
+        else:
+            with self._lock:
+                lease = self._leases.pop(lease_id, None)
+        if lease is None or lease[1] < now:
+            return None
+        return lease[0]
+
+    def _sign(self, key: tuple, expires_at: float) -> str:
+        host, port, protocol = key
+        payload = f"{host}|{port}|{protocol}|{int(expires_at)}|{secrets.token_hex(4)}".encode()
+        signature = hmac.new(self._secret, payload, hashlib.sha256).hexdigest()[:24]
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=') + '.' + signature
+
+    def _verify(self, lease_id: str) -> Optional[tuple]:
+        try:
+            encoded, signature = lease_id.split('.')
+            payload = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            expected = hmac.new(self._secret, payload, hashlib.sha256).hexdigest()[:24]
+            if not hmac.compare_digest(signature, expected):
+                return None
+            host, port, protocol, expires_at, _ = payload.decode().split('|')
+            return (host, int(port), protocol), float(expires_at)
+        except ValueError:
+            return None
+
+    def _purge(self, now: float):
+        # 定期清理过期租约，避免客户端不归还时无限增长
+        expired = [lease_id for lease_id, (_, expires_at) in self._leases.items() if expires_at < now]
+        for lease_id in expired:
+            del self._leases[lease_id]
+        self._next_purge = now + min(self.ttl, 60)
@@ -0,0 +1,200 @@
+"""进程内指标，按 Prometheus 文本格式输出
+
+记录时只做计数和桶累加，格式化只在 /metrics 被抓取时进行，没人抓取时开销可以忽略。
+多worker部署时每个进程各自统计，爬取和验证相关的指标只出现在主进程上(见 proxypool_leader)。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+_REGISTRY: list = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict = {}
+        _REGISTRY.append(self)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in items]
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """抓取时调用 function 取值，适合索引大小这类随时可读的状态"""
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            return [f'{self.name} {_format_value(self._function())}']
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # 每个桶各自的计数(最后一个是 +Inf)，以及总和
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][slot] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = []
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in _REGISTRY) + '\n'
+
+
+class RequestTimer:
+    """只记录指定路径请求耗时的ASGI中间件，不经过 BaseHTTPMiddleware，额外开销很小"""
+
+    def __init__(self, app, paths: tuple):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope['path'], status[0])
+
+
+# 爬取
+SOURCE_FETCH_SECONDS = Histogram(
+    'proxypool_source_fetch_seconds', '抓取单个代理源地址的耗时', ('source',))
+SOURCE_FETCHES = Counter(
+    'proxypool_source_fetches_total', '代理源抓取次数，status 为 ok/not_modified/error', ('source', 'status'))
+SOURCE_PROXIES = Counter(
+    'proxypool_source_proxies_total', '从代理源解析出的代理数量(含未变化时复用的结果)', ('source',))
+PARSE_SECONDS = Histogram(
+    'proxypool_parse_seconds', '解析单个页面的耗时', ('source',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+# 验证
+VALIDATION_SECONDS = Histogram(
+    'proxypool_validation_seconds', '单次验证耗时，按协议、阶段和结果区分', ('protocol', 'stage', 'outcome'))
+VALIDATOR_INFLIGHT = Gauge(
+    'proxypool_validator_inflight', '正在进行的验证数量', ('stage',))
+
+NEGATIVE_CACHE_SKIPPED = Counter(
+    'proxypool_negative_cache_skipped_total', '因最近已确认失效而跳过验证的代理数量')
+
+# 数据库和周期任务
+DB_WRITE_SECONDS = Histogram(
+    'proxypool_db_write_seconds', '批量写库耗时')
+DB_WRITE_ROWS = Counter(
+    'proxypool_db_write_rows_total', '批量写入的行数')
+CYCLE_SECONDS = Histogram(
+    'proxypool_cycle_seconds', '周期任务耗时，cycle 为 crawl/refresh', ('cycle',),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+
+# 接口
+HTTP_REQUEST_SECONDS = Histogram(
+    'proxypool_http_request_seconds', '接口请求耗时', ('path', 'status'),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+# 池状态，抓取时读取
+INDEX_SIZE = Gauge('proxypool_index_size', '内存索引中可分配的代理数量')
+SCHEDULED = Gauge('proxypool_scheduled', '复查队列中的代理数量')
+LEADER = Gauge('proxypool_leader', '当前进程是否为负责爬取和验证的主进程')
+NEGATIVE_CACHE_SIZE = Gauge('proxypool_negative_cache_size', '失效代理缓存中的条目数量')
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Index, create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -17,6 +17,24 @@ class Proxy(Base):
     is_valid = Column(Boolean, default=True)
     fail_count = Column(Integer, default=0)  # 连续失败次数
     source = Column(String)  # 代理来源
+    # 质量评分，见 scoring.py
+    success_rate = Column(Float)  # 成功率(指数加权)
+    latency_ewma = Column(Float)  # 延迟均值(秒，指数加权)
+    latency_var = Column(Float)  # 延迟方差
+    check_count = Column(Integer, default=0)  # 累计检查次数
+    score = Column(Float)  # 综合分数，越小越好
+    # 匿名度和出口IP，见 anonymity.py；没有配置回显地址时为空
+    anonymity = Column(String)  # transparent/anonymous/elite
+    egress_ip = Column(String)
+
+    __table_args__ = (
+        # 同一地址+协议只保留一行，批量写入依赖它做 ON CONFLICT
+        Index('ux_proxies_endpoint', 'host', 'port', 'protocol', unique=True),
+        # 按有效性筛选并按延迟排序/过滤
+        Index('ix_proxies_valid_latency', 'is_valid', 'response_time'),
+        # 清理长时间未检查的代理
+        Index('ix_proxies_last_check', 'last_check'),
+    )
     
     def to_dict(self):
         return {
@@ -28,15 +46,98 @@ class Proxy(Base):
             'response_time': self.response_time,
             'is_valid': self.is_valid,
             'fail_count': self.fail_count,
-            'source': self.source
+            'source': self.source,
+            'success_rate': self.success_rate,
+            'latency_ewma': self.latency_ewma,
+            'check_count': self.check_count,
+            'score': self.score,
+            'anonymity': self.anonymity,
+            'egress_ip': self.egress_ip
         }
     
     @property
     def url(self):
         return f"{self.protocol}://{self.host}:{self.port}"
 
+class ProxyProfile(Base):
+    """代理在各验证配置(profiles.py)下的检查结果，每个代理每个配置一行"""
+    __tablename__ = 'proxy_profiles'
+
+    id = Column(Integer, primary_key=True)
+    host = Column(String, nullable=False)
+    port = Column(Integer, nullable=False)
+    protocol = Column(String, nullable=False)
+    profile = Column(String, nullable=False)
+    ok = Column(Boolean, default=False)  # 最近一次检查是否通过
+    last_check = Column(DateTime)
+    response_time = Column(Float)
+    success_rate = Column(Float)
+    latency_ewma = Column(Float)
+    latency_var = Column(Float)
+    check_count = Column(Integer, default=0)
+    score = Column(Float)
+
+    __table_args__ = (
+        Index('ux_proxy_profiles_endpoint', 'host', 'port', 'protocol', 'profile', unique=True),
+    )
+
+class ProxyReport(Base):
+    """非主进程收到的客户端上报，由主进程读取后计入代理统计并删除"""
+    __tablename__ = 'proxy_reports'
+
+    id = Column(Integer, primary_key=True)
+    host = Column(String, nullable=False)
+    port = Column(Integer, nullable=False)
+    protocol = Column(String, nullable=False)
+    outcome = Column(String, nullable=False)  # success/failure
+    latency = Column(Float)
+    reported_at = Column(DateTime, default=datetime.utcnow)
+
+def _ensure_columns(engine):
+    # create_all 不会给已有的表加列，缺少的列用 ALTER TABLE 补上
+    existing = {column['name'] for column in inspect(engine).get_columns(Proxy.__tablename__)}
+    missing = [column for column in Proxy.__table__.columns if column.name not in existing]
+    if not missing:
+        return
+    with engine.begin() as conn:
+        for column in missing:
+            conn.execute(text(
+                f"ALTER TABLE {Proxy.__tablename__} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+            ))
+        # 旧版本用 999999 表示验证失败，改为保留空值
+        conn.execute(text("UPDATE proxies SET response_time = NULL WHERE response_time >= 999999"))
+
+def _ensure_indexes(engine):
+    # 旧版本创建的表缺少索引，create_all不会补建；唯一索引需要先去重
+    existing = {index['name'] for index in inspect(engine).get_indexes(Proxy.__tablename__)}
+    missing = [index for index in Proxy.__table__.indexes if index.name not in existing]
+    if not missing:
+        return
+    with engine.begin() as conn:
+        if any(index.unique for index in missing):
+            conn.execute(text(
+                "DELETE FROM proxies WHERE id NOT IN "
+                "(SELECT MIN(id) FROM proxies GROUP BY host, port, protocol)"
+            ))
+        for index in missing:
+            index.create(conn)
+
+def _configure_sqlite(engine, busy_timeout_ms: int = 5000):
+    # WAL模式下读写互不阻塞；写锁冲突时等待而不是立即报错；WAL下NORMAL同步级别已足够安全
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
 def init_db(db_url='sqlite:///proxies.db'):
     engine = create_engine(db_url)
+    if engine.dialect.name == 'sqlite':
+        _configure_sqlite(engine)
     Base.metadata.create_all(engine)
+    _ensure_columns(engine)
+    _ensure_indexes(engine)
     SessionLocal = sessionmaker(bind=engine)
     return SessionLocal 
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""最近确认失效的代理，跨爬取周期跳过它们
+
+公开列表会反复收录早已失效的代理，清理后下一轮爬取又会带回来，每个都要付出一次完整的超时。
+这里按打包后的整数key记录它们，在 ttl 秒内再次爬到时直接跳过。
+需要按时间过期和在代理恢复时移除，所以用带过期时间的LRU而不是布隆过滤器。
+"""
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Iterable
+from .candidate import pack_key
+
+
+class NegativeCache:
+    def __init__(self, capacity: int = 200000, ttl: float = 6 * 3600):
+        self.capacity = capacity
+        self.ttl = ttl
+        # key -> 过期时间；按加入顺序排列，ttl固定，所以最前面的也最先过期
+        self._entries: OrderedDict[int, float] = OrderedDict()
+        # 累计跳过的代理数量
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: int) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.time():
+            del self._entries[key]
+            return False
+        return True
+
+    def add(self, proxy, now: float = None):
+        now = time.time() if now is None else now
+        key = pack_key(proxy.host, proxy.port, proxy.protocol)
+        self._entries[key] = now + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def discard(self, proxy):
+        # 代理重新验证通过时移除
+        self._entries.pop(pack_key(proxy.host, proxy.port, proxy.protocol), None)
+
+    def filter(self, proxies: Iterable) -> list:
+        """去掉缓存中的代理，返回其余的"""
+        self.purge()
+        fresh = [proxy for proxy in proxies
+                 if pack_key(proxy.host, proxy.port, proxy.protocol) not in self]
+        self.skipped += len(proxies) - len(fresh)
+        return fresh
+
+    def purge(self, now: float = None) -> int:
+        """移除已过期的条目"""
+        now = time.time() if now is None else now
+        removed = 0
+        while self._entries:
+            key, expires_at = next(iter(self._entries.items()))
+            if expires_at >= now:
+                break
+            del self._entries[key]
+            removed += 1
+        return removed
+
+    def dump(self) -> list:
+        return list(self._entries.items())
+
+    def save(self, path: str, entries: list = None):
+        # 先写临时文件再原子替换
+        entries = self.dump() if entries is None else entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.dead-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'written_at': time.time(), 'entries': entries}, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path: str) -> int:
+        """从文件恢复未过期的条目，文件不存在时返回0"""
+        try:
+            with open(path) as f:
+                entries = json.load(f)['entries']
+        except FileNotFoundError:
+            return 0
+        now = time.time()
+        for key, expires_at in entries:
+            if expires_at >= now:
+                self._entries[key] = expires_at
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return len(self._entries)
@@ -0,0 +1,37 @@
+import re
+import logging
+from typing import List, Tuple
+import chardet
+
+logger = logging.getLogger(__name__)
+
+_OCTET = r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+IPV4_PATTERN = re.compile(rf'^{_OCTET}(?:\.{_OCTET}){{3}}$')
+# 整个缓冲区一次扫描：行首可有空白和协议前缀(socks5://)，ip:port 之后允许跟 :user:pass 等内容
+IP_PORT_PATTERN = re.compile(
+    rf'^[ \t]*(?:(https?|socks[45])://)?({_OCTET}(?:\.{_OCTET}){{3}}):([0-9]{{1,5}})(?![0-9.])',
+    re.M | re.I
+)
+
+
+def decode_content(content: bytes) -> str:
+    """解码页面内容：绝大多数列表是ASCII/UTF-8，直接解码；失败时再用chardet检测编码"""
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        encoding = chardet.detect(content)['encoding'] or 'utf-8'
+        return content.decode(encoding, errors='ignore')
+
+
+def parse_ip_port(content: str, protocol: str = 'http') -> List[Tuple[str, int, str]]:
+    """解析纯文本 ip:port 列表，返回 (host, port, protocol) 元组列表
+
+    protocol 是来源地址对应的协议，行内带协议前缀时以前缀为准
+    """
+    if not content:
+        return []
+    return [
+        (host, port, scheme.lower() if scheme else protocol)
+        for scheme, host, port in ((m[0], m[1], int(m[2])) for m in IP_PORT_PATTERN.findall(content))
+        if port <= 65535
+    ]
@@ -1,29 +1,215 @@
 import asyncio
 import logging
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import select, delete
-from .models import Proxy, init_db
+from sqlalchemy import select, delete, exists, func, case, tuple_
+from typing import Iterator, Optional
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import Proxy, ProxyProfile, ProxyReport, init_db
+from .candidate import ProxyCandidate, pack_key
 from .crawler import ProxyCrawler
 from .validator import ProxyValidator
+from .index import ProxyIndex, Strategy, proxy_key
+from .lease import LeaseManager, load_secret
+from .scheduler import RevalidationScheduler
+from .negative_cache import NegativeCache
+from .scoring import record_check
+from .leader import LeaderLock, exclusive
+from .snapshot import append_journal, read_journal, read_snapshot, read_snapshot_with_header, write_snapshot
+from .sources import SourceTracker
+from .profiles import ProfileHealth, load_profiles
+from .anonymity import at_least
+from . import metrics
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 连续失败超过该次数的代理会被标记无效并清理
+MAX_FAIL_COUNT = 3
+
+# 超过该时间(秒)未检查的代理会被清理
+STALE_AFTER = 3600
+
+# 冲突时用新验证结果覆盖的列
+UPSERT_COLUMNS = ('last_check', 'response_time', 'is_valid', 'fail_count',
+                  'success_rate', 'latency_ewma', 'latency_var', 'check_count', 'score',
+                  'anonymity', 'egress_ip')
+
+# 验证配置结果表中随每次检查更新的列
+PROFILE_COLUMNS = ProfileHealth.__slots__
+
+
+def anonymity_filter(minimum: Optional[str]):
+    # 按最低匿名度过滤索引中的代理数据，不限时返回None
+    if minimum is None:
+        return None
+    return lambda data: at_least(data.get('anonymity'), minimum)
+
 
 class ProxyPool:
-    def __init__(self, db_url: str = None):
+    def __init__(self, db_url: str = None, crawl_interval: float = 300, validation_budget: int = 200,
+                 data_dir: str = 'data'):
+        # 确保data目录存在
+        os.makedirs(data_dir, exist_ok=True)
         if db_url is None:
-            # 确保data目录存在
-            os.makedirs('data', exist_ok=True)
-            db_url = 'sqlite:///data/proxies.db'
+            db_url = f'sqlite:///{data_dir}/proxies.db'
 
-        self.SessionLocal = init_db(db_url)
+        # 多个worker同时启动时，建表和补列、补索引不能并发执行；
+        # 租约签名密钥同样在锁内生成，所有worker读到同一个，租约可以在任一worker上归还
+        with exclusive(os.path.join(data_dir, 'init.lock')):
+            self.SessionLocal = init_db(db_url)
+            lease_secret = os.environ.get('PROXY_LEASE_SECRET') or load_secret(
+                os.path.join(data_dir, 'lease.secret'))
+        # 后台写库都在这一个线程里串行执行，SQLite同一时间也只允许一个写入者
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='proxy-db')
         self.crawler = ProxyCrawler()
-        self.validator = ProxyValidator()
+        self.validator = ProxyValidator(test_url=os.environ.get('PROXY_TEST_URL'),
+                                        echo_url=os.environ.get('PROXY_ECHO_URL'))
+        self.index = ProxyIndex()
+        self.leases = LeaseManager(secret=lease_secret)
+        self.scheduler = RevalidationScheduler()
+        # 最近因连续失败被移除的代理，再次爬到时在有效期内直接跳过
+        self.dead = NegativeCache()
+        # 爬取间隔(秒)和每秒最多派发的复查数量
+        self.crawl_interval = crawl_interval
+        self.validation_budget = validation_budget
+        # 多进程部署：持有主锁的进程负责爬取验证并写索引快照，其他进程读取快照
+        self.data_dir = data_dir
+        self.leader = LeaderLock(os.path.join(data_dir, 'leader.lock'))
+        self.snapshot_path = os.path.join(data_dir, 'index.snapshot')
+        self.dead_path = os.path.join(data_dir, 'dead.cache')
+        self.sources_path = os.path.join(data_dir, 'sources.json')
+        self.snapshot_interval = 2.0
+        self.election_interval = 5.0
+        # 快照路径 -> 已加载的快照文件修改时间
+        self._snapshot_mtimes: dict[str, int] = {}
+        # 快照路径 -> (已加载快照的 generation, 变化日志已读到的偏移)
+        self._journal_offsets: dict[str, tuple[Optional[str], int]] = {}
+        # 按目标站点的验证配置，每个配置一个单独排序的索引
+        self.validator.profiles = load_profiles(
+            os.environ.get('PROXY_PROFILES') or os.path.join(data_dir, 'profiles.json'))
+        self.profile_indexes = {profile.name: ProxyIndex(profile=profile.name)
+                                for profile in self.validator.profiles}
+        self._started_at = time.time()
+        # 启动时快照其余部分在后台加载，加载完成(或不需要)时置位
+        self._snapshot_loaded = threading.Event()
+        metrics.INDEX_SIZE.set_function(lambda: len(self.index))
+        metrics.SCHEDULED.set_function(lambda: len(self.scheduler))
+        metrics.LEADER.set_function(lambda: 1 if self.leader.held else 0)
+        metrics.NEGATIVE_CACHE_SIZE.set_function(lambda: len(self.dead))
+        self.load_index()
         logger.info("代理池初始化完成")
 
+    def reload_index(self):
+        # 从数据库重建内存索引(包括各验证配置的索引)
+        db = self.SessionLocal()
+        try:
+            proxies = self.get_candidates(db, valid_only=True)
+        finally:
+            db.close()
+        for index in (self.index, *self.profile_indexes.values()):
+            index.rebuild(proxies)
+        logger.info(f"内存索引已加载 {len(self.index)} 个有效代理")
+
+    def update_indexes(self, proxy: ProxyCandidate):
+        # 按最新验证结果更新默认索引和各验证配置的索引
+        self.index.update(proxy)
+        for index in self.profile_indexes.values():
+            index.update(proxy)
+
+    def index_for(self, profile: Optional[str] = None) -> ProxyIndex:
+        """默认索引或指定验证配置的索引，配置不存在时抛出 KeyError"""
+        return self.index if profile is None else self.profile_indexes[profile]
+
+    def _snapshot_targets(self) -> list[tuple[str, ProxyIndex]]:
+        # (快照路径, 索引)，默认索引在前
+        return [(self.snapshot_path, self.index)] + [
+            (os.path.join(self.data_dir, f'index.{name}.snapshot'), index)
+            for name, index in self.profile_indexes.items()
+        ]
+
+    async def run_db(self, func):
+        """在专用数据库线程中执行 func(db)，事件循环上的验证和接口请求不会被阻塞"""
+        def call():
+            db = self.SessionLocal()
+            try:
+                return func(db)
+            finally:
+                db.close()
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, call)
+
+    def load_index(self, head: int = 1000):
+        """启动时优先从快照恢复索引，没有可用快照时从数据库加载
+
+        先同步加载排名最靠前的 head 条，立即可以分配代理；其余部分在后台线程中补齐。
+        """
+        start = time.perf_counter()
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+            header, records = read_snapshot_with_header(self.snapshot_path, limit=head)
+            self.index.restore(records)
+        except FileNotFoundError:
+            self.reload_index()
+            self._snapshot_loaded.set()
+            return
+        except Exception as e:
+            logger.error(f"加载索引快照失败: {str(e)}")
+            self.reload_index()
+            self._snapshot_loaded.set()
+            return
+        self._snapshot_mtimes[self.snapshot_path] = mtime
+        self._journal_offsets[self.snapshot_path] = (header.get('generation'), 0)
+        logger.info(f"从快照加载前 {len(self.index)} 个有效代理，耗时 {time.perf_counter() - start:.3f}秒")
+        if len(self.index) == head:
+            # 补齐期间验证结果可能已经更新或移除了部分代理，补齐时跳过它们
+            self.index.track_changes()
+            threading.Thread(target=self._load_snapshot_rest, args=(head,), daemon=True).start()
+        else:
+            self._snapshot_loaded.set()
+        self._load_profile_snapshots()
+
+    def _load_profile_snapshots(self):
+        # 各验证配置的索引通常不大，直接整体加载；没有快照的从数据库重建
+        missing = []
+        for path, index in self._snapshot_targets()[1:]:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                header = self._restore_snapshot(path, index)
+                self._snapshot_mtimes[path] = mtime
+                self._journal_offsets[path] = (header.get('generation'), 0)
+            except Exception as e:
+                if not isinstance(e, FileNotFoundError):
+                    logger.error(f"加载索引快照失败: {str(e)}")
+                missing.append(index)
+        if missing:
+            db = self.SessionLocal()
+            try:
+                proxies = self.get_candidates(db, valid_only=True)
+            finally:
+                db.close()
+            for index in missing:
+                index.rebuild(proxies)
+
+    @staticmethod
+    def _restore_snapshot(path: str, index: ProxyIndex) -> dict:
+        # 用完整快照替换索引，返回快照表头
+        header, records = read_snapshot_with_header(path)
+        index.restore(records)
+        return header
+
+    def _load_snapshot_rest(self, skip: int):
+        try:
+            if self.index.extend(read_snapshot(self.snapshot_path, skip=skip)):
+                logger.info(f"快照加载完成，共 {len(self.index)} 个有效代理")
+        except Exception as e:
+            logger.error(f"加载索引快照失败: {str(e)}")
+        finally:
+            self._snapshot_loaded.set()
+
     async def get_db(self):
         db = self.SessionLocal()
         try:
@@ -31,32 +217,118 @@ class ProxyPool:
         finally:
             db.close()
 
-    async def add_proxies(self, proxies: list[Proxy], db: Session):
+    def upsert_proxies(self, proxies: list[ProxyCandidate], db: Session, chunk_size: int = 1000) -> int:
+        """批量写入代理：新代理插入，已存在的(host, port, protocol)更新验证结果
+
+        只在这里把候选记录转换成表的行，ORM 对象不会进入爬取和验证流程。
+        """
         if not proxies:
-            return
+            return 0
 
-        added_count = 0
+        start = time.perf_counter()
+        table = Proxy.__table__
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.host, table.c.port, table.c.protocol],
+            set_={name: stmt.excluded[name] for name in UPSERT_COLUMNS}
+        )
+        rows = [
+            {
+                'host': proxy.host,
+                'port': proxy.port,
+                'protocol': proxy.protocol,
+                'source': proxy.source,
+                'last_check': proxy.last_check or datetime.utcnow(),
+                'response_time': proxy.response_time,
+                'is_valid': True if proxy.is_valid is None else proxy.is_valid,
+                'fail_count': proxy.fail_count or 0,
+                'success_rate': proxy.success_rate,
+                'latency_ewma': proxy.latency_ewma,
+                'latency_var': proxy.latency_var,
+                'check_count': proxy.check_count or 0,
+                'score': proxy.score,
+                'anonymity': proxy.anonymity,
+                'egress_ip': proxy.egress_ip,
+            }
+            for proxy in proxies
+        ]
+        # 各验证配置的检查结果写入单独的窄表
+        health_rows = [
+            dict(host=proxy.host, port=proxy.port, protocol=proxy.protocol, profile=name,
+                 **{column: getattr(health, column) for column in PROFILE_COLUMNS})
+            for proxy in proxies if getattr(proxy, 'health', None)
+            for name, health in proxy.health.items()
+        ]
+        # 新代理还没有id，同时取回写库后的id，索引和快照里的数据才完整
+        # 同一批里可能有重复的地址(例如两个来源都爬到)，取回的id写到每一个上
+        missing_ids: dict[tuple, list[ProxyCandidate]] = {}
         for proxy in proxies:
-            stmt = select(Proxy).where(
-                Proxy.host == proxy.host,
-                Proxy.port == proxy.port,
-                Proxy.protocol == proxy.protocol
+            if proxy.id is None:
+                missing_ids.setdefault(proxy_key(proxy), []).append(proxy)
+        if missing_ids:
+            stmt = stmt.returning(table.c.host, table.c.port, table.c.protocol, table.c.id)
+        # 分块executemany，整体在一个事务里提交
+        for i in range(0, len(rows), chunk_size):
+            result = db.execute(stmt, rows[i:i + chunk_size])
+            if missing_ids:
+                for host, port, protocol, proxy_id in result:
+                    for proxy in missing_ids.get((host, port, protocol), ()):
+                        proxy.id = proxy_id
+        if health_rows:
+            profiles = ProxyProfile.__table__
+            health_stmt = sqlite_insert(profiles)
+            health_stmt = health_stmt.on_conflict_do_update(
+                index_elements=[profiles.c.host, profiles.c.port, profiles.c.protocol, profiles.c.profile],
+                set_={name: health_stmt.excluded[name] for name in PROFILE_COLUMNS}
             )
-            existing = db.execute(stmt).scalar()
-            if not existing:
-                db.add(proxy)
-                added_count += 1
+            for i in range(0, len(health_rows), chunk_size):
+                db.execute(health_stmt, health_rows[i:i + chunk_size])
         db.commit()
-        logger.info(f"新增 {added_count} 个代理")
+        metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+        metrics.DB_WRITE_ROWS.inc(amount=len(rows))
+        return len(rows)
 
-    async def remove_invalid_proxies(self, db: Session):
-        stmt = delete(Proxy).where(
-            (Proxy.fail_count > 3) |
-            (Proxy.last_check < datetime.utcnow() - timedelta(hours=1))
-        )
-        result = db.execute(stmt)
-        db.commit()
-        logger.info(f"清理 {result.rowcount} 个无效代理")
+    async def add_proxies(self, proxies: list[ProxyCandidate]):
+        if not proxies:
+            return
+
+        written = await self.run_db(lambda db: self.upsert_proxies(proxies, db))
+        logger.info(f"写入 {written} 个代理")
+
+    async def remove_invalid_proxies(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+        condition = Proxy.fail_count > MAX_FAIL_COUNT
+        # 启动后先给复查留出一段时间，停机期间变旧的代理不会被直接删掉
+        expire_stale = time.time() - self._started_at >= STALE_AFTER
+        if expire_stale:
+            condition = condition | (Proxy.last_check < cutoff)
+        stmt = delete(Proxy).where(condition).returning(Proxy.host, Proxy.port, Proxy.protocol)
+        # 代理删除后，它在各验证配置下的结果一并删除
+        orphans = delete(ProxyProfile).where(~exists().where(
+            Proxy.host == ProxyProfile.host,
+            Proxy.port == ProxyProfile.port,
+            Proxy.protocol == ProxyProfile.protocol
+        ))
+
+        def remove(db: Session) -> list[tuple]:
+            removed = [tuple(row) for row in db.execute(stmt)]
+            if removed:
+                db.execute(orphans)
+            db.commit()
+            return removed
+
+        removed = await self.run_db(remove)
+        # 行已删除，旧id不能再用：移出复查队列；正在验证的清掉id，验证完写库时重新插入并取回新id
+        for key in removed:
+            proxy = self.scheduler.get(key)
+            if proxy is not None:
+                proxy.id = None
+                self.scheduler.discard(proxy)
+        if expire_stale:
+            # 长时间未检查的代理同时从内存索引移除
+            for index in (self.index, *self.profile_indexes.values()):
+                index.remove_checked_before(cutoff.replace(tzinfo=timezone.utc).timestamp())
+        logger.info(f"清理 {len(removed)} 个无效代理")
 
     def get_all_proxies(self, db: Session, valid_only: bool = True) -> list[Proxy]:
         stmt = select(Proxy)
@@ -66,55 +338,539 @@ class ProxyPool:
         logger.debug(f"获取 {len(proxies)} 个代理")
         return proxies
 
+    def get_candidates(self, db: Session, valid_only: bool = True,
+                       keys: list[tuple] = None) -> list[ProxyCandidate]:
+        """按列读取代理，直接构造轻量记录，不经过ORM实例化；keys 为 (host, port, protocol) 时只读这些"""
+        stmt = select(*Proxy.__table__.columns)
+        if valid_only:
+            stmt = stmt.where(Proxy.is_valid == True)
+        if keys is not None:
+            stmt = stmt.where(tuple_(Proxy.host, Proxy.port, Proxy.protocol).in_(keys))
+        proxies = [ProxyCandidate.from_row(row) for row in db.execute(stmt)]
+        if self.profile_indexes:
+            self._attach_health(db, proxies, keys)
+        return proxies
+
+    def _attach_health(self, db: Session, proxies: list[ProxyCandidate], keys: list[tuple] = None):
+        # 读取已配置的验证配置的检查结果，挂到对应代理的 health 上
+        by_key = {proxy_key(proxy): proxy for proxy in proxies}
+        table = ProxyProfile.__table__
+        stmt = select(table.c.host, table.c.port, table.c.protocol, table.c.profile,
+                      *(table.c[column] for column in PROFILE_COLUMNS)
+                      ).where(table.c.profile.in_(list(self.profile_indexes)))
+        if keys is not None:
+            stmt = stmt.where(tuple_(table.c.host, table.c.port, table.c.protocol).in_(keys))
+        for host, port, protocol, profile, *values in db.execute(stmt):
+            proxy = by_key.get((host, port, protocol))
+            if proxy is None:
+                continue
+            health = ProfileHealth()
+            for column, value in zip(PROFILE_COLUMNS, values):
+                setattr(health, column, value)
+            if proxy.health is None:
+                proxy.health = {}
+            proxy.health[profile] = health
+
+    def page_proxies(self, db: Session, after_id: int = 0, limit: int = 1000, valid_only: bool = True,
+                     protocol: Optional[str] = None, source: Optional[str] = None,
+                     max_latency: Optional[float] = None) -> list[Proxy]:
+        """按id做键集分页，返回 id 大于 after_id 的下一页代理"""
+        stmt = select(Proxy).where(Proxy.id > after_id)
+        if valid_only:
+            stmt = stmt.where(Proxy.is_valid == True)
+        if protocol:
+            stmt = stmt.where(Proxy.protocol == protocol)
+        if source:
+            stmt = stmt.where(Proxy.source == source)
+        if max_latency is not None:
+            stmt = stmt.where(Proxy.response_time <= max_latency)
+        stmt = stmt.order_by(Proxy.id).limit(limit)
+        return list(db.execute(stmt).scalars())
+
+    def iter_proxies(self, after_id: int = 0, chunk_size: int = 1000, **filters) -> Iterator[dict]:
+        """逐页读取全部匹配的代理，用于流式输出；每页用独立会话，不长时间占用连接"""
+        while True:
+            db = self.SessionLocal()
+            try:
+                page = [proxy.to_dict() for proxy in
+                        self.page_proxies(db, after_id=after_id, limit=chunk_size, **filters)]
+            finally:
+                db.close()
+            yield from page
+            if len(page) < chunk_size:
+                return
+            after_id = page[-1]['id']
+
+    def count_proxies(self, db: Session) -> dict:
+        """在SQL里汇总总数、有效数，以及按来源和协议的分布"""
+        valid = func.sum(case((Proxy.is_valid == True, 1), else_=0))
+        total_count, valid_count = db.execute(select(func.count(), valid)).one()
+
+        def breakdown(column) -> dict:
+            rows = db.execute(select(column, func.count(), valid).group_by(column))
+            return {key or 'unknown': {'total': total, 'valid': valid_rows or 0}
+                    for key, total, valid_rows in rows}
+
+        return {
+            'total': total_count,
+            'valid': valid_count or 0,
+            'success_rate': (valid_count or 0) / total_count if total_count else 0,
+            'by_source': breakdown(Proxy.source),
+            'by_protocol': breakdown(Proxy.protocol),
+            'by_anonymity': breakdown(Proxy.anonymity),
+            # 有效代理实际使用的不同出口IP数
+            'valid_egress_ips': db.execute(select(func.count(func.distinct(Proxy.egress_ip)))
+                                           .where(Proxy.is_valid == True)).scalar(),
+        }
+
+    async def load_proxies(self, valid_only: bool = True) -> list[ProxyCandidate]:
+        # 在数据库线程中读取，返回的记录与会话无关，可以直接交给验证器修改
+        return await self.run_db(lambda db: self.get_candidates(db, valid_only=valid_only))
+
+    async def validate_and_store(self, proxies, batch_size: int = 1000,
+                                 flush_interval: float = 5.0) -> int:
+        """流式验证代理，每个结果立即更新内存索引和复查计划，并分批写回数据库(攒满一批或每 flush_interval 秒)
+
+        proxies 可以是列表，也可以是持续供给的 asyncio.Queue(复查循环使用)。
+        还没有写过库(没有id)的代理等写库取回id后再加入索引。
+        """
+        total_count = proxies.qsize() if isinstance(proxies, asyncio.Queue) else len(proxies)
+        valid_count = 0
+        batch = []
+        last_flush = time.monotonic()
+
+        async def flush():
+            nonlocal batch, last_flush
+            pending, batch = batch, []
+            last_flush = time.monotonic()
+            # 写库前没有id的(新代理，或行已被清理的)取回id后才加入索引
+            missing = [proxy for proxy in pending if proxy.id is None]
+            await self.run_db(lambda db: self.upsert_proxies(pending, db))
+            for proxy in missing:
+                if proxy.id is not None:
+                    self.update_indexes(proxy)
+
+        async def flush_on_timer():
+            # 供给停下来时，已攒下的结果也按时写库并加入索引，不用等下一个结果
+            while True:
+                await asyncio.sleep(max(0.0, last_flush + flush_interval - time.monotonic()))
+                if time.monotonic() - last_flush >= flush_interval:
+                    try:
+                        await flush()
+                    except Exception as e:
+                        logger.error(f"写入验证结果失败: {str(e)}")
+
+        timer = asyncio.create_task(flush_on_timer())
+        try:
+            async for proxy in self.validator.iter_validate(proxies):
+                if proxy.id is not None:
+                    self.update_indexes(proxy)
+                self.crawler.tracker.record_check(proxy)
+                if proxy.fail_count > MAX_FAIL_COUNT:
+                    self.scheduler.discard(proxy)
+                    self.dead.add(proxy)
+                else:
+                    self.scheduler.schedule(proxy)
+                if proxy.is_valid:
+                    valid_count += 1
+                    self.dead.discard(proxy)
+                batch.append(proxy)
+                if len(batch) >= batch_size:
+                    await flush()
+        finally:
+            timer.cancel()
+            await asyncio.gather(timer, return_exceptions=True)
+        await flush()
+        logger.info(f"代理验证完成，{valid_count}/{total_count} 个有效")
+        return valid_count
+
     async def refresh_proxies(self):
         logger.info("开始刷新代理池...")
-        db = self.SessionLocal()
+        start = time.perf_counter()
         try:
             # 爬取新代理
             logger.info("开始爬取新代理...")
-            new_proxies = await self.crawler.crawl()
+            crawled = await self.crawler.crawl()
+            existing_proxies = await self.load_proxies(valid_only=False)
+            # 库中已有的代理在下面和现有代理一起验证；当作新代理写入会把连续失败次数清零
+            known = {pack_key(proxy.host, proxy.port, proxy.protocol) for proxy in existing_proxies}
+            new_proxies = self.skip_dead(
+                [proxy for proxy in crawled if pack_key(proxy.host, proxy.port, proxy.protocol) not in known])
+            self.crawler.tracker.record_new(new_proxies)
             if new_proxies:
                 logger.info(f"爬取到 {len(new_proxies)} 个新代理")
                 # 验证新代理
                 logger.info("开始验证新代理...")
-                validated_proxies = await self.validator.validate_proxies(new_proxies)
-                # 添加到数据库
-                await self.add_proxies(validated_proxies, db)
+                await self.validate_and_store(new_proxies)
 
             # 验证现有代理
             logger.info("开始验证现有代理...")
-            existing_proxies = self.get_all_proxies(db, valid_only=False)
             if existing_proxies:
-                validated_existing = await self.validator.validate_proxies(existing_proxies)
-                for proxy in validated_existing:
-                    db.merge(proxy)
-                db.commit()
+                await self.validate_and_store(existing_proxies)
 
             # 清理无效代理
-            await self.remove_invalid_proxies(db)
+            await self.remove_invalid_proxies()
+            # 用数据库中的最终结果校正索引(补上新代理的id，去掉已清理的代理)
+            valid_proxies = await self.load_proxies(valid_only=True)
+            for index in (self.index, *self.profile_indexes.values()):
+                index.rebuild(valid_proxies)
+            await self.save_dead()
+            await self.save_sources()
+            metrics.CYCLE_SECONDS.observe(time.perf_counter() - start, 'refresh')
             logger.info("代理池刷新完成")
         except Exception as e:
             logger.error(f"刷新代理池时发生错误: {str(e)}")
             raise  # 重新抛出异常，让上层处理
-        finally:
-            db.close()
 
-    def get_proxy(self, db: Session) -> Proxy:
-        stmt = select(Proxy).where(
-            Proxy.is_valid == True
-        ).order_by(Proxy.response_time.asc())
-        return db.execute(stmt).scalar()
+    def get_proxy(self, strategy: Strategy = Strategy.BEST, profile: Optional[str] = None,
+                  anonymity: Optional[str] = None) -> dict | None:
+        # 直接从内存索引按选择策略取代理；指定验证配置时从该配置的索引取
+        return self.index_for(profile).select(strategy, anonymity_filter(anonymity))
 
-    async def start(self):
-        logger.info("代理池服务启动")
+    def lease_proxies(self, count: int, strategy: Strategy = Strategy.BEST, profile: Optional[str] = None,
+                      anonymity: Optional[str] = None, distinct_egress: bool = False) -> list[dict]:
+        """一次分配 count 个不重复的代理，每个附带租约ID和过期时间
+
+        anonymity 为最低匿名度；distinct_egress 为True时返回的代理出口IP各不相同。
+        """
+        leased = []
+        for key, data in self.index_for(profile).select_many(
+                count, strategy, anonymity_filter(anonymity), distinct_egress):
+            lease_id, expires_at = self.leases.grant(key)
+            leased.append(dict(
+                data,
+                lease_id=lease_id,
+                expires_at=datetime.utcfromtimestamp(expires_at).isoformat()
+            ))
+        return leased
+
+    async def report_proxies(self, reports: list[tuple]) -> int:
+        """处理客户端上报 [(lease_id, 结果, 延迟)]，结果为 release/success/failure
+
+        成功和失败会立即计入代理的评分并更新内存索引，
+        不必等下一轮验证。返回有效租约的数量。
+
+        非主进程的索引跟随主进程的快照，在本地更新会被下一次快照覆盖，
+        因此只把结果写入 proxy_reports 表，由主进程读取后处理。
+        """
+        accepted = 0
+        outcomes = []
+        for lease_id, outcome, latency in reports:
+            key = self.leases.release(lease_id)
+            if key is None:
+                continue
+            accepted += 1
+            if outcome != 'release':
+                outcomes.append((key, outcome, latency))
+        if outcomes:
+            if self.leader.held:
+                await self.apply_reports(outcomes)
+            else:
+                await self.run_db(lambda db: self.queue_reports(outcomes, db))
+        return accepted
+
+    def queue_reports(self, outcomes: list[tuple], db: Session) -> int:
+        # 非主进程把上报结果交给主进程
+        now = datetime.utcnow()
+        db.execute(ProxyReport.__table__.insert(), [
+            {'host': host, 'port': port, 'protocol': protocol, 'outcome': outcome,
+             'latency': latency, 'reported_at': now}
+            for (host, port, protocol), outcome, latency in outcomes
+        ])
+        db.commit()
+        return len(outcomes)
+
+    def take_reports(self, db: Session, limit: int = 5000) -> list[tuple]:
+        """按上报顺序取出并删除最多 limit 条其他进程的上报，返回 [(代理key, 结果, 延迟)]"""
+        table = ProxyReport.__table__
+        rows = db.execute(select(table.c.id, table.c.host, table.c.port, table.c.protocol,
+                                 table.c.outcome, table.c.latency).order_by(table.c.id).limit(limit)).all()
+        if not rows:
+            return []
+        db.execute(delete(table).where(table.c.id <= rows[-1].id))
+        db.commit()
+        return [((row.host, row.port, row.protocol), row.outcome, row.latency) for row in rows]
+
+    async def apply_reports(self, outcomes: list[tuple]) -> int:
+        """把 [(代理key, 结果, 延迟)] 计入代理的统计并写库，返回更新的代理数
+
+        结果记在复查队列持有的候选记录上，下一次复查写库时不会覆盖掉上报的失败次数；
+        不在队列中的代理从数据库读取。
+        """
+        missing = list({key for key, _, _ in outcomes if self.scheduler.get(key) is None})
+        loaded = {}
+        if missing:
+            loaded = {proxy_key(proxy): proxy for proxy in await self.run_db(
+                lambda db: self.get_candidates(db, valid_only=False, keys=missing))}
+        touched = {}
+        for key, outcome, latency in outcomes:
+            proxy = self.scheduler.get(key) or loaded.get(key)
+            if proxy is None:
+                continue
+            proxy.last_check = datetime.utcnow()
+            record_check(proxy, outcome == 'success', latency)
+            if outcome == 'success':
+                proxy.fail_count = 0
+                proxy.is_valid = True
+            else:
+                proxy.fail_count = (proxy.fail_count or 0) + 1
+                if proxy.fail_count > MAX_FAIL_COUNT:
+                    proxy.is_valid = False
+                    self.dead.add(proxy)
+                    self.scheduler.discard(proxy)
+            touched[key] = proxy
+        if touched:
+            proxies = list(touched.values())
+            await self.run_db(lambda db: self.upsert_proxies(proxies, db))
+            for proxy in proxies:
+                self.index.update(proxy)
+                if not proxy.is_valid:
+                    for index in self.profile_indexes.values():
+                        index.discard(proxy_key(proxy))
+        return len(touched)
+
+    async def close(self):
+        # 关闭爬虫和验证器持有的长连接会话
+        await self.crawler.close()
+        await self.validator.close()
+        # 等待已提交的写入完成
+        await asyncio.get_running_loop().run_in_executor(None, self._db_executor.shutdown)
+        logger.info("代理池资源已释放")
+
+    async def load_schedule(self):
+        # 按数据库中的上次检查时间恢复复查计划
+        proxies = await self.load_proxies(valid_only=False)
+        self.scheduler.load(proxies)
+        logger.info(f"复查计划已加载 {len(proxies)} 个代理")
+
+    def expedite_stale(self) -> int:
+        """索引中超过基础复查间隔未检查的代理(通常来自重启前的快照)排到队列最前面
+
+        快照里有但数据库里没有的(写库前进程退出)作为新代理加入。
+        """
+        expedited = 0
+        for checked, data in self.index.checked_before(time.time() - self.scheduler.base_interval):
+            key = (data['host'], data['port'], data['protocol'])
+            # 到期时间取上次检查时间，越旧越先复查，并且早于所有正常排队的代理
+            if key in self.scheduler:
+                expedited += self.scheduler.expedite(key, checked)
+            else:
+                expedited += self.scheduler.add_new([ProxyCandidate.from_dict(data)], now=checked)
+        if expedited:
+            logger.info(f"{expedited} 个过期的可用代理优先复查")
+        return expedited
+
+    def skip_dead(self, proxies: list) -> list:
+        """去掉负缓存中最近已确认失效的代理"""
+        fresh = self.dead.filter(proxies)
+        skipped = len(proxies) - len(fresh)
+        if skipped:
+            metrics.NEGATIVE_CACHE_SKIPPED.inc(amount=skipped)
+            logger.info(f"跳过 {skipped} 个最近已确认失效的代理")
+        return fresh
+
+    async def save_dead(self):
+        try:
+            await asyncio.to_thread(self.dead.save, self.dead_path, self.dead.dump())
+        except Exception as e:
+            logger.error(f"写入失效代理缓存失败: {str(e)}")
+
+    async def save_sources(self):
+        try:
+            await asyncio.to_thread(self.crawler.tracker.save, self.sources_path)
+        except Exception as e:
+            logger.error(f"写入代理源统计失败: {str(e)}")
+
+    def source_stats(self) -> dict:
+        """各代理源的产出统计；非主进程读取主进程写出的文件"""
+        if self.leader.held:
+            return self.crawler.tracker.stats()
+        tracker = SourceTracker()
+        try:
+            tracker.load(self.sources_path)
+        except Exception as e:
+            logger.error(f"读取代理源统计失败: {str(e)}")
+        return tracker.stats()
+
+    def schedule_stats(self) -> dict:
+        now = time.time()
+        return {
+            'role': 'leader' if self.leader.held else 'follower',
+            'scheduler': self.scheduler.stats(now),
+            'staleness': self.index.staleness(now),
+            'validation': self.validator.stats.to_dict(),
+            'negative_cache': {'size': len(self.dead), 'skipped': self.dead.skipped},
+            'profiles': {name: len(index) for name, index in self.profile_indexes.items()},
+        }
+
+    async def _expedite_after_load(self):
+        # 快照全部加载后再找过期的代理，后台补齐的部分同样能提前复查
+        await asyncio.to_thread(self._snapshot_loaded.wait)
+        self.expedite_stale()
+
+    async def _report_loop(self, interval: float = 1.0):
+        # 定期处理其他进程转交的客户端上报
         while True:
             try:
-                await self.refresh_proxies()
-                logger.info("等待5分钟后进行下一次刷新...")
-                await asyncio.sleep(300)  # 每5分钟刷新一次
+                outcomes = await self.run_db(self.take_reports)
+                if outcomes:
+                    updated = await self.apply_reports(outcomes)
+                    logger.debug(f"处理 {len(outcomes)} 条其他进程的上报，更新 {updated} 个代理")
+                    continue
             except asyncio.CancelledError:
-                logger.info("代理池服务停止")
-                break
+                raise
             except Exception as e:
-                logger.error(f"代理池服务发生错误: {str(e)}")
+                logger.error(f"处理其他进程的上报失败: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def _crawl_loop(self):
+        while True:
+            try:
+                start = time.perf_counter()
+                # 只抓取已到期的地址，各地址的间隔按其产出调整
+                new_proxies = await self.crawler.crawl(force=False)
+                fresh = [proxy for proxy in self.skip_dead(new_proxies) if proxy_key(proxy) not in self.scheduler]
+                self.crawler.tracker.record_new(fresh)
+                # 按来源的验证通过率错开到期时间
+                added = self.scheduler.add_new(fresh, delay=self.crawler.tracker.validation_delay)
+                logger.info(f"爬取到 {len(new_proxies)} 个代理，其中 {added} 个加入验证队列")
+                await self.remove_invalid_proxies()
+                await self.save_dead()
+                await self.save_sources()
+                metrics.CYCLE_SECONDS.observe(time.perf_counter() - start, 'crawl')
+                await asyncio.sleep(self.crawl_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"爬取代理时发生错误: {str(e)}")
                 await asyncio.sleep(60)  # 发生错误时等待1分钟后重试
+
+    async def _dispatch_loop(self, feed: asyncio.Queue):
+        # 每秒把最多 validation_budget 个到期代理送入验证流；验证跟不上时 put 会阻塞
+        while True:
+            for proxy in self.scheduler.pop_due(self.validation_budget):
+                await feed.put(proxy)
+            await asyncio.sleep(1)
+
+    async def _revalidate_loop(self, feed: asyncio.Queue):
+        while True:
+            try:
+                await self.validate_and_store(feed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"复查代理时发生错误: {str(e)}")
+                self.scheduler.requeue_inflight()
+                await asyncio.sleep(5)
+
+    async def start(self):
+        logger.info("代理池服务启动")
+        self._started_at = time.time()
+        loaded = await asyncio.to_thread(self.dead.load, self.dead_path)
+        if loaded:
+            logger.info(f"已加载 {loaded} 个最近失效的代理")
+        try:
+            await asyncio.to_thread(self.crawler.tracker.load, self.sources_path)
+        except Exception as e:
+            logger.error(f"读取代理源统计失败: {str(e)}")
+        await self.load_schedule()
+        feed: asyncio.Queue = asyncio.Queue(maxsize=self.validation_budget)
+        tasks = [
+            asyncio.create_task(self._expedite_after_load()),
+            asyncio.create_task(self._report_loop()),
+            asyncio.create_task(self._crawl_loop()),
+            asyncio.create_task(self._dispatch_loop(feed)),
+            asyncio.create_task(self._revalidate_loop(feed)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            logger.info("代理池服务停止")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _snapshot_loop(self):
+        # 定期把索引的变化追加到变化日志，日志太长(或索引被整体替换过)时才重写完整快照；
+        # 每个索引一个文件，导出和序列化都在线程中进行
+        journaled: dict[str, Optional[int]] = {}
+        interval = self.snapshot_interval
+        while True:
+            await asyncio.sleep(interval)
+            start = time.perf_counter()
+            for path, index in self._snapshot_targets():
+                try:
+                    changes = index.take_changes()
+                    count = journaled.get(path)
+                    if changes is None or count is None or count + len(changes) > len(index) // 2 + 1000:
+                        journaled[path] = None
+                        await asyncio.to_thread(lambda: write_snapshot(path, index.dump()))
+                        journaled[path] = 0
+                    elif changes:
+                        journaled[path] = None
+                        await asyncio.to_thread(append_journal, path, changes)
+                        journaled[path] = count + len(changes)
+                except Exception as e:
+                    # 这次的变化没有写出，下次重写完整快照
+                    logger.error(f"写入索引快照失败: {str(e)}")
+            # 索引很大、重写一次要很久时相应拉长间隔，写快照最多占一半时间
+            interval = max(self.snapshot_interval, 2 * (time.perf_counter() - start))
+
+    async def _follow_snapshots(self):
+        # 快照文件的修改时间变化时重新加载对应的索引，之后只应用变化日志中新追加的部分
+        for path, index in self._snapshot_targets():
+            try:
+                current = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            try:
+                if current != self._snapshot_mtimes.get(path):
+                    # 解析和构造新状态都在线程中，事件循环只在替换时短暂等锁
+                    header = await asyncio.to_thread(self._restore_snapshot, path, index)
+                    self._snapshot_mtimes[path] = current
+                    self._journal_offsets[path] = (header.get('generation'), 0)
+                generation, offset = self._journal_offsets.get(path, (None, 0))
+                result = await asyncio.to_thread(read_journal, path, generation, offset)
+                if result is not None:
+                    records, offset = result
+                    await asyncio.to_thread(index.apply_changes, records)
+                    self._journal_offsets[path] = (generation, offset)
+            except Exception as e:
+                logger.error(f"加载索引快照失败: {str(e)}")
+
+    async def serve(self, follow_interval: float = 1.0):
+        """多进程部署的入口：只有抢到主锁的进程运行爬取和验证，其余进程跟随快照
+
+        主进程退出后锁自动释放，跟随的进程会在下一次选举时接管。
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+        next_election = 0.0
+        while True:
+            # 接管前同样先跟上上一任主进程留下的变化日志
+            await self._follow_snapshots()
+            if time.monotonic() >= next_election:
+                if self.leader.try_acquire():
+                    break
+                next_election = time.monotonic() + self.election_interval
+            await asyncio.sleep(follow_interval)
+
+        logger.info(f"进程 {os.getpid()} 成为主进程，负责爬取和验证")
+        writer = asyncio.create_task(self._snapshot_loop())
+        try:
+            await self.start()
+        finally:
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+            # 退出前写一次最新的快照，下次启动直接加载
+            for path, index in self._snapshot_targets():
+                try:
+                    write_snapshot(path, index.dump())
+                except Exception as e:
+                    logger.error(f"写入索引快照失败: {str(e)}")
+            try:
+                self.dead.save(self.dead_path)
+            except Exception as e:
+                logger.error(f"写入失效代理缓存失败: {str(e)}")
+            self.leader.release()
+
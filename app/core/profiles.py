@@ -0,0 +1,91 @@
+"""按目标站点的验证配置
+
+默认验证只说明代理能访问验证地址，不代表对实际要抓取的站点可用或够快。
+每个配置指定目标地址、期望的状态码(和响应内容)、超时和复查间隔；
+只对通过默认验证的代理检查，复用同一个连接会话，在它的默认复查时顺带检查已到期的配置，
+增加配置不会增加爬取和预检的开销。
+
+配置从 JSON 文件读取(环境变量 PROXY_PROFILES 指定路径，默认 data/profiles.json)：
+    [{"name": "google", "url": "https://www.google.com/generate_204", "expected_status": [204],
+      "timeout": 5, "interval": 900}]
+"""
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class ValidationProfile:
+    def __init__(self, name: str, url: str, expected_status: tuple = (200,), body_contains: str = None,
+                 timeout: float = 10, interval: float = 900):
+        if not PROFILE_NAME.match(name):
+            raise ValueError(f"无效的配置名: {name}")
+        self.name = name
+        self.url = url
+        self.expected_status = tuple(expected_status)
+        # 响应体需要包含的文本，为空时只检查状态码；可用来识别被封禁时返回的验证页
+        self.body_contains = body_contains
+        self.timeout = timeout
+        # 同一代理两次检查该配置的最短间隔(秒)，实际间隔不会短于代理本身的复查间隔
+        self.interval = interval
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ValidationProfile':
+        return cls(
+            name=data['name'],
+            url=data['url'],
+            expected_status=data.get('expected_status', (200,)),
+            body_contains=data.get('body_contains'),
+            timeout=data.get('timeout', 10),
+            interval=data.get('interval', 900),
+        )
+
+
+class ProfileHealth:
+    """代理在某个配置下的检查结果和滚动统计，字段与 scoring.record_check 使用的一致"""
+
+    __slots__ = ('ok', 'last_check', 'response_time', 'success_rate', 'latency_ewma',
+                 'latency_var', 'check_count', 'score')
+
+    def __init__(self):
+        self.ok = False
+        self.last_check: Optional[datetime] = None
+        self.response_time = None
+        self.success_rate = None
+        self.latency_ewma = None
+        self.latency_var = None
+        self.check_count = 0
+        self.score = None
+
+    def checked_at(self) -> float:
+        return self.last_check.replace(tzinfo=timezone.utc).timestamp() if self.last_check else 0.0
+
+    def to_dict(self) -> dict:
+        # 合并进代理数据，由 /proxy?profile= 返回
+        return {
+            'profile_ok': self.ok,
+            'profile_last_check': self.last_check.isoformat() if self.last_check else None,
+            'profile_latency': self.latency_ewma,
+            'profile_success_rate': self.success_rate,
+            'profile_score': self.score,
+        }
+
+
+def load_profiles(path: str) -> list[ValidationProfile]:
+    """读取配置文件，文件不存在时返回空列表"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    profiles = [ValidationProfile.from_dict(item) for item in data]
+    names = [profile.name for profile in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError(f"配置名重复: {names}")
+    logger.info(f"已加载验证配置: {', '.join(names)}")
+    return profiles
@@ -0,0 +1,140 @@
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+from .index import proxy_key, checked_at
+from .candidate import ProxyCandidate
+
+
+class RevalidationScheduler:
+    """按下次检查时间排序的复查队列
+
+    每个代理只在到期时复查：越快的有效代理复查越频繁，失败的代理按失败次数指数退避。
+    堆里采用惰性删除，_due 记录每个代理当前有效的到期时间。
+    """
+
+    def __init__(self, base_interval: float = 300, min_interval: float = 60,
+                 max_interval: float = 3600, slow_latency: float = 5.0):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slow_latency = slow_latency
+        self._heap: list[tuple] = []
+        self._due: dict[tuple, float] = {}
+        self._proxies: dict[tuple, ProxyCandidate] = {}
+        self._inflight: dict[tuple, ProxyCandidate] = {}
+        self._seq = itertools.count()
+        # 最近60秒每秒完成的检查数，用于计算稳态吞吐
+        self._completed: deque = deque(maxlen=60)
+        self.total_checks = 0
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._due or key in self._inflight
+
+    def interval_for(self, proxy: ProxyCandidate) -> float:
+        if proxy.is_valid:
+            # 响应越快复查越频繁，达到slow_latency及以上按基础间隔
+            latency = proxy.latency_ewma if proxy.latency_ewma is not None else proxy.response_time
+            ratio = min(1.0, (latency if latency is not None else self.slow_latency) / self.slow_latency)
+            return self.min_interval + (self.base_interval - self.min_interval) * ratio
+        fails = max(1, proxy.fail_count or 1)
+        return min(self.max_interval, self.base_interval * 2 ** (fails - 1))
+
+    def _push(self, key: tuple, proxy: ProxyCandidate, due: float):
+        self._due[key] = due
+        self._proxies[key] = proxy
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+
+    def add_new(self, proxies: Iterable[ProxyCandidate], now: float = None,
+                delay: Callable[[ProxyCandidate], float] = None) -> int:
+        """加入新爬取的代理，立即到期(或按 delay 推迟几秒，用于区分优先级)；已在队列或正在验证的跳过"""
+        now = time.time() if now is None else now
+        added = 0
+        for proxy in proxies:
+            key = proxy_key(proxy)
+            if key in self:
+                continue
+            self._push(key, proxy, now + delay(proxy) if delay is not None else now)
+            added += 1
+        return added
+
+    def load(self, proxies: Iterable[ProxyCandidate]):
+        """按上次检查时间恢复已有代理的复查计划"""
+        for proxy in proxies:
+            self._push(proxy_key(proxy), proxy, checked_at(proxy) + self.interval_for(proxy))
+
+    def schedule(self, proxy: ProxyCandidate, now: float = None):
+        """验证结果到达后安排下一次检查"""
+        now = time.time() if now is None else now
+        key = proxy_key(proxy)
+        self._inflight.pop(key, None)
+        self._record_check(now)
+        self._push(key, proxy, now + self.interval_for(proxy))
+
+    def expedite(self, key: tuple, due: float) -> bool:
+        """把已排队代理的到期时间提前到 due，正在验证或未排队的返回False"""
+        if key not in self._due or due >= self._due[key]:
+            return False
+        self._push(key, self._proxies[key], due)
+        return True
+
+    def get(self, key: tuple) -> Optional[ProxyCandidate]:
+        """排队或正在验证的候选记录，不在队列中时返回None"""
+        return self._proxies.get(key) or self._inflight.get(key)
+
+    def discard(self, proxy: ProxyCandidate):
+        key = proxy_key(proxy)
+        self._inflight.pop(key, None)
+        self._due.pop(key, None)
+        self._proxies.pop(key, None)
+
+    def pop_due(self, limit: int, now: float = None) -> list[ProxyCandidate]:
+        """取出最多 limit 个已到期的代理，标记为验证中"""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and len(due) < limit and self._heap[0][0] <= now:
+            due_at, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) != due_at:
+                continue  # 已被重新安排或移除
+            del self._due[key]
+            proxy = self._proxies.pop(key)
+            self._inflight[key] = proxy
+            due.append(proxy)
+        return due
+
+    def requeue_inflight(self, now: float = None) -> int:
+        """验证流异常中断时，把验证中的代理重新放回队列立即到期"""
+        now = time.time() if now is None else now
+        inflight, self._inflight = self._inflight, {}
+        for key, proxy in inflight.items():
+            self._push(key, proxy, now)
+        return len(inflight)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _record_check(self, now: float):
+        self.total_checks += 1
+        second = int(now)
+        if self._completed and self._completed[-1][0] == second:
+            self._completed[-1][1] += 1
+        else:
+            self._completed.append([second, 1])
+
+    def stats(self, now: float = None) -> dict:
+        now = time.time() if now is None else now
+        window = [count for second, count in self._completed if second > now - 60]
+        next_due = self.next_due()
+        return {
+            'scheduled': len(self._due),
+            'inflight': len(self._inflight),
+            'overdue_seconds': round(max(0.0, now - next_due), 1) if next_due else 0.0,
+            'checks_per_second': round(sum(window) / 60, 2),
+            'total_checks': self.total_checks,
+        }
@@ -0,0 +1,55 @@
+"""代理质量评分
+
+每次检查(定时验证或客户端上报)都增量更新代理的滚动统计：
+- success_rate: 成功率的指数加权平均
+- latency_ewma / latency_var: 成功请求延迟的指数加权均值和方差
+- check_count: 累计检查次数
+
+score 近似为"拿到一次成功响应的期望耗时"，越小越好：(延迟均值 + 标准差) / 成功率。
+"""
+import math
+from typing import Optional
+
+# 指数加权平均的平滑系数，越大越看重最近的结果
+SUCCESS_ALPHA = 0.2
+LATENCY_ALPHA = 0.3
+# 没有历史记录时的成功率先验，一次碰巧成功的代理不会排到多次验证可用的代理前面
+PRIOR_SUCCESS_RATE = 0.5
+MIN_SUCCESS_RATE = 0.05
+
+
+def compute_score(latency: Optional[float], variance: Optional[float], success_rate: float) -> Optional[float]:
+    if latency is None:
+        return None
+    spread = math.sqrt(max(variance or 0.0, 0.0))
+    return (latency + spread) / max(success_rate, MIN_SUCCESS_RATE)
+
+
+def record_check(proxy, success: bool, latency: Optional[float] = None):
+    """把一次检查结果并入代理的滚动统计，并重新计算分数"""
+    proxy.check_count = (proxy.check_count or 0) + 1
+    rate = proxy.success_rate if proxy.success_rate is not None else PRIOR_SUCCESS_RATE
+    proxy.success_rate = rate + SUCCESS_ALPHA * ((1.0 if success else 0.0) - rate)
+
+    if success and latency is not None:
+        proxy.response_time = latency
+        if proxy.latency_ewma is None:
+            proxy.latency_ewma = latency
+            proxy.latency_var = 0.0
+        else:
+            # 增量更新指数加权均值和方差
+            diff = latency - proxy.latency_ewma
+            increment = LATENCY_ALPHA * diff
+            proxy.latency_ewma += increment
+            proxy.latency_var = (1 - LATENCY_ALPHA) * ((proxy.latency_var or 0.0) + diff * increment)
+
+    proxy.score = compute_score(proxy.latency_ewma, proxy.latency_var, proxy.success_rate)
+
+
+def score_of(proxy) -> float:
+    """排序用的分数，越小越优先；没有任何成功记录的为无穷大"""
+    if proxy.score is not None:
+        return proxy.score
+    # 尚未评分的旧数据按最近一次响应时间和先验成功率估算
+    score = compute_score(proxy.response_time, 0.0, PRIOR_SUCCESS_RATE)
+    return score if score is not None else float('inf')
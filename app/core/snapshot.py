@@ -0,0 +1,106 @@
+"""内存索引的磁盘快照：主进程定期原子写出，启动时和其他worker读取
+
+文件按排名顺序每行一条记录，第一行是表头：
+    {"written_at": ..., "generation": ..., "fields": ["id", "host", ...]}
+    [分数, 最后检查时间, 字段值...]
+按行存储可以只读取排名最靠前的一部分，先开始服务再加载其余部分。
+
+两次完整快照之间的变化追加到同名的 .journal 文件，第一行是对应快照的 generation：
+    {"generation": ...}
+    [分数, 最后检查时间, 代理数据]
+分数为null的记录表示该代理已移除。其他worker只需读取新追加的部分，不用每次重新加载整个快照。
+"""
+import json
+import os
+import secrets
+import tempfile
+import time
+from itertools import islice
+from typing import Optional
+
+
+def journal_path(path: str) -> str:
+    return path + '.journal'
+
+
+def _write_atomic(path: str, write):
+    # 先写临时文件再原子替换，读取方不会看到写了一半的文件
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.snapshot-')
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'w') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_snapshot(path: str, records: list) -> str:
+    """写出完整快照并清空变化日志，返回新快照的 generation"""
+    fields = list(records[0][2]) if records else []
+    generation = secrets.token_hex(8)
+
+    def write(f):
+        f.write(json.dumps({'written_at': time.time(), 'generation': generation, 'fields': fields}) + '\n')
+        for score, checked, data in records:
+            f.write(json.dumps([score, checked, *data.values()], separators=(',', ':')) + '\n')
+    _write_atomic(path, write)
+    # 先替换快照再替换日志：读取方在两者之间看到的日志属于旧快照，generation 不一致会被忽略
+    _write_atomic(journal_path(path), lambda f: f.write(json.dumps({'generation': generation}) + '\n'))
+    return generation
+
+
+def read_snapshot_with_header(path: str, skip: int = 0, limit: Optional[int] = None) -> tuple[dict, list]:
+    """返回 (表头, [分数, 最后检查时间, 代理数据])，可跳过前 skip 条、最多读取 limit 条"""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        fields = header['fields']
+        stop = None if limit is None else skip + limit
+        records = []
+        for line in islice(f, skip, stop):
+            row = json.loads(line)
+            records.append([row[0], row[1], dict(zip(fields, row[2:]))])
+        return header, records
+
+
+def read_snapshot(path: str, skip: int = 0, limit: Optional[int] = None) -> list:
+    """读取 [分数, 最后检查时间, 代理数据]，可跳过前 skip 条、最多读取 limit 条"""
+    return read_snapshot_with_header(path, skip, limit)[1]
+
+
+def append_journal(path: str, records: list):
+    """把变化记录追加到快照的变化日志，一次写入，读取方只处理完整的行"""
+    if not records:
+        return
+    lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+    with open(journal_path(path), 'a') as f:
+        f.write(lines)
+
+
+def read_journal(path: str, generation: Optional[str], offset: int = 0) -> Optional[tuple[list, int]]:
+    """从字节偏移 offset 开始读取变化日志，返回 (记录, 新的偏移)
+
+    偏移为0时从表头之后开始。日志不存在或不属于 generation 对应的快照时返回None。
+    """
+    if generation is None:
+        return None
+    try:
+        f = open(journal_path(path), 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        header = f.readline()
+        try:
+            if not header.endswith(b'\n') or json.loads(header).get('generation') != generation:
+                return None
+        except ValueError:
+            return None
+        if offset == 0:
+            offset = len(header)
+        f.seek(offset)
+        data = f.read()
+    # 最后一行可能还没写完，留到下次
+    end = data.rfind(b'\n') + 1
+    records = [json.loads(line) for line in data[:end].splitlines() if line]
+    return records, offset + end
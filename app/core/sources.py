@@ -0,0 +1,187 @@
+"""按代理源地址统计产出，并据此调整抓取间隔和新代理的验证优先级
+
+每个地址记录：抓取耗时和结果、每次抓取贡献的新代理(池中还没有的)、这些新代理首次验证的通过率。
+两者相乘得到"每次抓取大约带来多少个可用代理"，产出高的地址按基础间隔抓取，
+产出越低间隔越长，很少更新或代理几乎都不可用的列表最长几小时才抓一次。
+通过率低于 TARGET_SUCCESS_RATE 的地址即使每次能带来不少可用代理也按比例拉长间隔，
+验证能力优先留给质量高的列表。间隔每次最多翻倍，抓取出错时只翻倍、不计入产出。
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Iterable, Optional
+
+# 每次抓取新代理数的指数加权系数
+YIELD_ALPHA = 0.3
+# 首次验证通过率的先验(折算成 PRIOR_WEIGHT 次检查)，检查数少时不至于大起大落
+PRIOR_SUCCESS_RATE = 0.2
+PRIOR_WEIGHT = 20
+# 通过率低于该值的地址按比例降低抓取频率
+TARGET_SUCCESS_RATE = 0.05
+
+
+class UrlStats:
+    __slots__ = ('source', 'fetches', 'errors', 'not_modified', 'last_status', 'fetch_seconds', 'last_count',
+                 'new_total', 'yield_ewma', 'checked', 'valid', 'interval', 'last_fetch', 'next_fetch')
+
+    def __init__(self, source: str, interval: float):
+        self.source = source
+        self.fetches = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.last_status: Optional[str] = None
+        self.fetch_seconds = 0.0
+        self.last_count = 0
+        self.new_total = 0
+        self.yield_ewma: Optional[float] = None
+        self.checked = 0
+        self.valid = 0
+        self.interval = interval
+        self.last_fetch = 0.0
+        self.next_fetch = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        return (self.valid + PRIOR_SUCCESS_RATE * PRIOR_WEIGHT) / (self.checked + PRIOR_WEIGHT)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SourceTracker:
+    def __init__(self, base_interval: float = 300, max_interval: float = 6 * 3600,
+                 priority_spread: float = 10.0, max_delay: float = 3600):
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        # 新代理推迟验证的秒数 = priority_spread * 每验证出一个可用代理预计要失败的次数
+        self.priority_spread = priority_spread
+        self.max_delay = max_delay
+        self._urls: dict[str, UrlStats] = {}
+        # 最近一次爬取抓取过的地址，等统计完新代理后再调整间隔
+        self._fetched: set = set()
+
+    def _get(self, source: str, url: str) -> UrlStats:
+        stats = self._urls.get(url)
+        if stats is None:
+            stats = self._urls[url] = UrlStats(source, self.base_interval)
+        return stats
+
+    def due(self, url: str, now: float = None) -> bool:
+        stats = self._urls.get(url)
+        return stats is None or stats.next_fetch <= (time.time() if now is None else now)
+
+    def record_fetch(self, source: str, url: str, status: str, seconds: float, count: int, now: float = None):
+        """记录一次抓取，status 为 ok/not_modified/error"""
+        stats = self._get(source, url)
+        stats.fetches += 1
+        stats.fetch_seconds += seconds
+        if status == 'error':
+            stats.errors += 1
+        elif status == 'not_modified':
+            stats.not_modified += 1
+        stats.last_status = status
+        stats.last_count = count
+        stats.last_fetch = time.time() if now is None else now
+        self._fetched.add(url)
+
+    def record_new(self, proxies: Iterable):
+        """记录本轮爬取中真正进入验证的新代理，并重新计算本轮抓取过的地址的间隔"""
+        counts: dict[str, int] = {}
+        for proxy in proxies:
+            if proxy.origin is not None:
+                counts[proxy.origin] = counts.get(proxy.origin, 0) + 1
+        for url in self._fetched:
+            stats = self._urls[url]
+            if stats.last_status == 'error':
+                stats.interval = min(self.max_interval, stats.interval * 2)
+            else:
+                new = counts.get(url, 0)
+                stats.new_total += new
+                stats.yield_ewma = new if stats.yield_ewma is None else \
+                    stats.yield_ewma + YIELD_ALPHA * (new - stats.yield_ewma)
+                stats.interval = min(self.interval_for(stats), stats.interval * 2)
+            stats.next_fetch = stats.last_fetch + stats.interval
+        self._fetched.clear()
+
+    def record_check(self, proxy):
+        """记录新代理的首次验证结果；记录后清除 origin，之后的复查不再计入"""
+        if proxy.origin is None:
+            return
+        stats = self._urls.get(proxy.origin)
+        proxy.origin = None
+        if stats is not None:
+            stats.checked += 1
+            if proxy.is_valid:
+                stats.valid += 1
+
+    def interval_for(self, stats: UrlStats) -> float:
+        # 每次抓取预计带来不到1个可用代理，或通过率过低时，按比例拉长
+        rate = stats.success_rate
+        expected = (stats.yield_ewma or 0.0) * rate
+        stretch = max(1.0, 1.0 / max(expected, 1e-9), TARGET_SUCCESS_RATE / rate)
+        return min(self.max_interval, self.base_interval * stretch)
+
+    def validation_delay(self, proxy) -> float:
+        """新代理的到期时间往后推的秒数，验证积压时通过率高的来源先验证
+
+        按失败次数与成功次数之比推迟，持续积压时也不会被低产出来源的旧代理挡住。
+        """
+        stats = self._urls.get(proxy.origin) if proxy.origin is not None else None
+        rate = stats.success_rate if stats is not None else PRIOR_SUCCESS_RATE
+        return min(self.max_delay, self.priority_spread * (1.0 / rate - 1.0))
+
+    def stats(self, now: float = None) -> dict:
+        """按来源分组的各地址统计"""
+        now = time.time() if now is None else now
+        result: dict[str, dict] = {}
+        for url, stats in self._urls.items():
+            source = result.setdefault(stats.source, {'fetches': 0, 'new_total': 0, 'checked': 0,
+                                                      'valid': 0, 'urls': []})
+            source['fetches'] += stats.fetches
+            source['new_total'] += stats.new_total
+            source['checked'] += stats.checked
+            source['valid'] += stats.valid
+            source['urls'].append({
+                'url': url,
+                'fetches': stats.fetches,
+                'errors': stats.errors,
+                'not_modified': stats.not_modified,
+                'last_status': stats.last_status,
+                'avg_fetch_seconds': round(stats.fetch_seconds / stats.fetches, 3) if stats.fetches else None,
+                'last_count': stats.last_count,
+                'new_total': stats.new_total,
+                'new_per_fetch': round(stats.yield_ewma, 1) if stats.yield_ewma is not None else None,
+                'checked': stats.checked,
+                'valid': stats.valid,
+                'success_rate': round(stats.success_rate, 3),
+                'interval': round(stats.interval),
+                'next_fetch_in': round(max(0.0, stats.next_fetch - now)),
+            })
+        return result
+
+    def save(self, path: str):
+        # 先写临时文件再原子替换；其他worker读取它响应 /sources，重启后据此恢复间隔
+        data = {url: stats.to_dict() for url, stats in self._urls.items()}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.sources-')
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'written_at': time.time(), 'urls': data}, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path: str) -> int:
+        """从文件恢复各地址的统计，文件不存在时返回0"""
+        try:
+            with open(path) as f:
+                data = json.load(f)['urls']
+        except FileNotFoundError:
+            return 0
+        for url, values in data.items():
+            stats = self._get(values['source'], url)
+            for name, value in values.items():
+                setattr(stats, name, value)
+        return len(data)
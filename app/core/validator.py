@@ -1,108 +1,380 @@
 import asyncio
 import time
 import logging
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Iterable, AsyncIterator, Union
 import aiohttp
+from aiohttp_socks import ProxyConnector
 from datetime import datetime
-from .models import Proxy
+from .anonymity import classify, parse_echo
+from .candidate import ProxyCandidate
+from .profiles import ProfileHealth, ValidationProfile
+from .scoring import record_check
+from .metrics import VALIDATION_SECONDS, VALIDATOR_INFLIGHT
 
 logger = logging.getLogger(__name__)
 
+_DONE = object()
+
+SOCKS_PROTOCOLS = ('socks4', 'socks5')
+
+
+class RateLimiter:
+    """按固定间隔放行的速率限制器，rate 为每秒允许的次数"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        now = asyncio.get_running_loop().time()
+        wait = self._next - now
+        self._next = max(self._next, now) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ValidationStats:
+    """按阶段统计通过/失败数量和累计耗时"""
+
+    STAGES = ('precheck', 'check')
+
+    def __init__(self):
+        self.counts = {stage: {'passed': 0, 'failed': 0, 'seconds': 0.0} for stage in self.STAGES}
+
+    def record(self, stage: str, passed: bool, seconds: float):
+        counts = self.counts[stage]
+        counts['passed' if passed else 'failed'] += 1
+        counts['seconds'] += seconds
+
+    def to_dict(self) -> dict:
+        return {
+            stage: dict(counts, seconds=round(counts['seconds'], 3))
+            for stage, counts in self.counts.items()
+        }
+
+    def summary(self) -> str:
+        return '; '.join(
+            f"{stage}: 通过 {c['passed']} 失败 {c['failed']} 耗时 {c['seconds']:.1f}秒"
+            for stage, c in self.counts.items()
+        )
+
+
 class ProxyValidator:
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, test_url: str = None,
+                 limit: int = 500, limit_per_host: int = 10,
+                 ttl_dns_cache: int = 300, keepalive_timeout: float = 15,
+                 concurrency: int = 200, rate_limit: float = 0,
+                 precheck_timeout: float = 1.5, precheck_concurrency: int = 1000,
+                 expected_status: tuple = (200, 204), echo_url: str = None):
         self.timeout = timeout
-        self.test_url = "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/2244/PNG"
-        
-    async def validate_proxy(self, proxy: Proxy) -> Tuple[bool, Optional[float]]:
+        # 同时进行中的验证数量，以及每秒最多发起的验证数(0表示不限速)
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        # 第一阶段：TCP连接预检，超时短、并发高，连不上的代理不进入完整验证；超时设为0则跳过预检
+        self.precheck_timeout = precheck_timeout
+        self.precheck_concurrency = precheck_concurrency
+        # 第二阶段：经代理请求一个轻量的验证地址
+        self.test_url = test_url or "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/2244/property/MolecularWeight/TXT"
+        self.expected_status = expected_status
+        # 回显地址：配置后默认验证改为请求它，顺带从响应判断匿名度和出口IP(anonymity.py)
+        self.echo_url = echo_url
+        # 不经代理看到的本机IP，缓存 real_ip_ttl 秒
+        self.real_ip_ttl = 3600
+        self._real_ips: frozenset = frozenset()
+        self._real_ips_at = 0.0
+        self._real_ip_lock = asyncio.Lock()
+        # 按目标站点的验证配置，只对通过上面验证的代理检查
+        self.profiles: list[ValidationProfile] = []
+        self.stats = ValidationStats()
+        # 连接池配置：总连接数、单个主机(代理)连接数、DNS缓存时间(秒)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 整个验证器共用一个会话和连接器，避免每次验证都重建连接池、DNS缓存和TLS上下文
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.ttl_dns_cache,
+                use_dns_cache=True,
+                keepalive_timeout=self.keepalive_timeout,
+                ssl=False
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def real_ips(self) -> frozenset:
+        """不经代理请求回显地址得到的本机IP，过期后由第一个调用者刷新，失败时沿用旧值"""
+        if time.time() - self._real_ips_at < self.real_ip_ttl:
+            return self._real_ips
+        async with self._real_ip_lock:
+            if time.time() - self._real_ips_at >= self.real_ip_ttl:
+                try:
+                    async with self._get_session().get(
+                        self.echo_url, timeout=aiohttp.ClientTimeout(total=self.timeout), ssl=False
+                    ) as response:
+                        echo = parse_echo(await response.read())
+                    if echo is None:
+                        raise ValueError("响应不是回显内容")
+                    self._real_ips = frozenset(echo[0])
+                    logger.info(f"本机出口IP: {', '.join(self._real_ips)}")
+                except Exception as e:
+                    logger.warning(f"获取本机IP失败: {str(e)}")
+                self._real_ips_at = time.time()
+        return self._real_ips
+
+    async def validate_proxy(self, proxy: ProxyCandidate) -> Tuple[bool, Optional[float]]:
         start_time = time.time()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.test_url,
-                    proxy=proxy.url,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout),
-                    ssl=False
-                ) as response:
-                    if response.status == 200:
-                        response_time = time.time() - start_time
-                        logger.debug(f"代理 {proxy.url} 验证成功，响应时间: {response_time:.2f}秒")
-                        return True, response_time
-                    logger.debug(f"代理 {proxy.url} 验证失败，状态码: {response.status}")
-                    return False, None
+            real_ips = await self.real_ips() if self.echo_url else None
+            if proxy.protocol in SOCKS_PROTOCOLS:
+                # aiohttp本身不支持SOCKS代理，连接器与代理地址绑定，只能每次单独建立
+                connector = ProxyConnector.from_url(proxy.url, ttl_dns_cache=self.ttl_dns_cache, ssl=False)
+                async with aiohttp.ClientSession(connector=connector) as session:
+                    return await self._check(session, proxy, None, start_time, self.echo_url, real_ips=real_ips)
+            # https列表里的代理同样是通过CONNECT转发的HTTP代理
+            proxy_url = f"http://{proxy.host}:{proxy.port}"
+            return await self._check(self._get_session(), proxy, proxy_url, start_time, self.echo_url,
+                                     real_ips=real_ips)
         except Exception as e:
             logger.debug(f"代理 {proxy.url} 验证出错: {str(e)}")
             return False, None
-            
-    async def validate_proxies(self, proxies: List[Proxy]) -> List[Proxy]:
+
+    async def _check(self, session: aiohttp.ClientSession, proxy: ProxyCandidate,
+                     proxy_url: Optional[str], start_time: float, url: str = None,
+                     expected_status: tuple = None, timeout: float = None,
+                     body_contains: str = None, real_ips: frozenset = None) -> Tuple[bool, Optional[float]]:
+        async with session.get(
+            url or self.test_url,
+            proxy=proxy_url,
+            timeout=aiohttp.ClientTimeout(total=timeout or self.timeout),
+            ssl=False
+        ) as response:
+            if response.status in (expected_status or self.expected_status):
+                # 读完响应体，连接才能放回连接池复用
+                body = await response.read()
+                if body_contains and body_contains.encode() not in body:
+                    logger.debug(f"代理 {proxy.url} 验证失败，响应内容不符")
+                    return False, None
+                if real_ips is not None:
+                    # 请求的是回显地址：被劫持或换成其他页面的响应同样视为失败
+                    echo = parse_echo(body)
+                    if echo is None:
+                        logger.debug(f"代理 {proxy.url} 验证失败，响应不是回显内容")
+                        return False, None
+                    proxy.egress_ip, proxy.anonymity = classify(*echo, real_ips)
+                response_time = time.time() - start_time
+                logger.debug(f"代理 {proxy.url} 验证成功，响应时间: {response_time:.2f}秒")
+                return True, response_time
+            logger.debug(f"代理 {proxy.url} 验证失败，状态码: {response.status}")
+            return False, None
+
+    def due_profiles(self, proxy: ProxyCandidate, now: float = None) -> list[ValidationProfile]:
+        """返回该代理已到复查时间的验证配置"""
+        now = time.time() if now is None else now
+        health = proxy.health or {}
+        return [profile for profile in self.profiles
+                if profile.name not in health or health[profile.name].checked_at() + profile.interval <= now]
+
+    async def check_profiles(self, proxy: ProxyCandidate, profiles: list[ValidationProfile]) -> dict:
+        """并发检查多个配置，返回 {配置名: (是否通过, 响应时间)}
+
+        http代理共用验证器的会话和连接池；SOCKS代理的各个配置共用一个会话。
+        """
+        async def check(session, proxy_url, profile):
+            start_time = time.time()
+            try:
+                return await self._check(session, proxy, proxy_url, start_time, profile.url,
+                                         profile.expected_status, profile.timeout, profile.body_contains)
+            except Exception as e:
+                logger.debug(f"代理 {proxy.url} 配置 {profile.name} 验证出错: {str(e)}")
+                return False, None
+
+        if proxy.protocol in SOCKS_PROTOCOLS:
+            connector = ProxyConnector.from_url(proxy.url, ttl_dns_cache=self.ttl_dns_cache, ssl=False)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                results = await asyncio.gather(*(check(session, None, profile) for profile in profiles))
+        else:
+            proxy_url = f"http://{proxy.host}:{proxy.port}"
+            session = self._get_session()
+            results = await asyncio.gather(*(check(session, proxy_url, profile) for profile in profiles))
+        return {profile.name: result for profile, result in zip(profiles, results)}
+
+    def _apply_profile_results(self, proxy: ProxyCandidate, results: dict):
+        if proxy.health is None:
+            proxy.health = {}
+        now = datetime.utcnow()
+        for name, (ok, response_time) in results.items():
+            health = proxy.health.get(name)
+            if health is None:
+                health = proxy.health[name] = ProfileHealth()
+            health.ok = ok
+            health.last_check = now
+            record_check(health, ok, response_time)
+
+    def _apply_result(self, proxy: ProxyCandidate, result):
+        proxy.last_check = datetime.utcnow()
+        if proxy.fail_count is None:
+            proxy.fail_count = 0
+        if isinstance(result, tuple):
+            is_valid, response_time = result
+        else:
+            is_valid, response_time = False, None
+        proxy.is_valid = is_valid
+        # 失败时保留上次成功的响应时间，失败体现在成功率和分数上
+        record_check(proxy, is_valid, response_time)
+        if is_valid:
+            proxy.fail_count = 0
+        else:
+            proxy.fail_count += 1
+
+    async def precheck(self, proxy: ProxyCandidate) -> bool:
+        """只建立到代理端口的TCP连接，确认主机可达"""
+        if not self.precheck_timeout:
+            return True
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(proxy.host, proxy.port),
+                timeout=self.precheck_timeout
+            )
+        except Exception:
+            return False
+        writer.close()
+        return True
+
+    async def iter_validate(self, proxies: Union[Iterable[ProxyCandidate], asyncio.Queue]
+                            ) -> AsyncIterator[ProxyCandidate]:
+        """两阶段流式验证，每完成一个就立即产出
+
+        预检worker共享输入迭代器做TCP连接检查，可达的代理进入队列，
+        由 concurrency 个完整验证worker消费；两个阶段都始终保持满负荷。
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        reachable: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        # 也可以传入 asyncio.Queue 作为持续供给的输入，放入 None 表示结束
+        feed = proxies if isinstance(proxies, asyncio.Queue) else None
+        source = None if feed is not None else iter(proxies)
+        limiter = RateLimiter(self.rate_limit) if self.rate_limit else None
+        stats = ValidationStats()
+        loop = asyncio.get_running_loop()
+
+        def record(stage: str, proxy: ProxyCandidate, passed: bool, start: float):
+            # 同时记入本次运行和累计统计，长期运行的验证流也能随时查看
+            seconds = loop.time() - start
+            stats.record(stage, passed, seconds)
+            self.stats.record(stage, passed, seconds)
+            VALIDATION_SECONDS.observe(seconds, proxy.protocol, stage, 'passed' if passed else 'failed')
+
+        async def next_proxy():
+            if feed is None:
+                return next(source, None)
+            proxy = await feed.get()
+            if proxy is None:
+                # 把结束标记放回去，让其他worker也能退出
+                feed.put_nowait(None)
+            return proxy
+
+        async def precheck_worker():
+            # 所有worker共享同一个输入，谁空闲谁取下一个代理
+            while (proxy := await next_proxy()) is not None:
+                start = loop.time()
+                VALIDATOR_INFLIGHT.inc('precheck')
+                try:
+                    passed = await self.precheck(proxy)
+                finally:
+                    VALIDATOR_INFLIGHT.dec('precheck')
+                if self.precheck_timeout:
+                    record('precheck', proxy, passed, start)
+                if passed:
+                    await reachable.put(proxy)
+                else:
+                    self._apply_result(proxy, None)
+                    await results.put(proxy)
+
+        async def check_worker():
+            while True:
+                proxy = await reachable.get()
+                if proxy is _DONE:
+                    break
+                if limiter is not None:
+                    await limiter.acquire()
+                start = loop.time()
+                VALIDATOR_INFLIGHT.inc('check')
+                try:
+                    result = await self.validate_proxy(proxy)
+                except Exception as e:
+                    logger.error(f"验证代理 {proxy.url} 失败: {str(e)}")
+                    result = None
+                finally:
+                    VALIDATOR_INFLIGHT.dec('check')
+                passed = bool(result and result[0])
+                record('check', proxy, passed, start)
+                self._apply_result(proxy, result)
+                # 通过默认验证后，在同一个worker里顺带检查已到期的验证配置
+                profiles = self.due_profiles(proxy) if passed and self.profiles else None
+                if profiles:
+                    start = loop.time()
+                    VALIDATOR_INFLIGHT.inc('profile')
+                    try:
+                        profile_results = await self.check_profiles(proxy, profiles)
+                    finally:
+                        VALIDATOR_INFLIGHT.dec('profile')
+                    seconds = loop.time() - start
+                    for name, (ok, _) in profile_results.items():
+                        VALIDATION_SECONDS.observe(seconds, proxy.protocol, f'profile:{name}',
+                                                   'passed' if ok else 'failed')
+                    self._apply_profile_results(proxy, profile_results)
+                await results.put(proxy)
+
+        async def close_precheck():
+            await asyncio.gather(*prechecks, return_exceptions=True)
+            for _ in checks:
+                await reachable.put(_DONE)
+
+        precheck_count = self.precheck_concurrency if self.precheck_timeout else self.concurrency
+        prechecks = [asyncio.create_task(precheck_worker()) for _ in range(precheck_count)]
+        checks = [asyncio.create_task(check_worker()) for _ in range(self.concurrency)]
+        closer = asyncio.create_task(close_precheck())
+        for task in checks:
+            task.add_done_callback(lambda _: results.put_nowait(_DONE))
+        remaining = len(checks)
+        try:
+            while remaining:
+                item = await results.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            tasks = prechecks + checks + [closer]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"验证阶段统计 - {stats.summary()}")
+
+    async def validate_proxies(self, proxies: List[ProxyCandidate]) -> List[ProxyCandidate]:
         if not proxies:
             return []
-            
-        logger.info(f"开始验证 {len(proxies)} 个代理...")
-        chunk_size = 200  # 每批验证的代理数量
+
+        total_count = len(proxies)
+        logger.info(f"开始验证 {total_count} 个代理...")
         validated_proxies = []
         valid_count = 0
-        total_count = len(proxies)
-        processed_count = 0
-        
-        # 分批处理代理
-        for i in range(0, total_count, chunk_size):
-            chunk = proxies[i:i + chunk_size]
-            tasks = []
-            chunk_proxies = []
-            
-            for proxy in chunk:
-                try:
-                    # 确保fail_count有初始值
-                    if proxy.fail_count is None:
-                        proxy.fail_count = 0
-                    if proxy.response_time is None:
-                        proxy.response_time = 999999
-                        
-                    task = self.validate_proxy(proxy)
-                    tasks.append(task)
-                    chunk_proxies.append(proxy)
-                except Exception as e:
-                    logger.error(f"创建验证任务失败: {str(e)}")
-                    continue
-                    
-            if not tasks:
-                continue
-                
-            try:
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for proxy, result in zip(chunk_proxies, results):
-                    try:
-                        proxy.last_check = datetime.utcnow()
-                        
-                        if isinstance(result, tuple):
-                            is_valid, response_time = result
-                            proxy.is_valid = is_valid
-                            proxy.response_time = response_time if response_time is not None else 999999
-                            if not is_valid:
-                                proxy.fail_count = (proxy.fail_count or 0) + 1
-                            else:
-                                proxy.fail_count = 0
-                                valid_count += 1
-                        else:
-                            proxy.is_valid = False
-                            proxy.fail_count = (proxy.fail_count or 0) + 1
-                            proxy.response_time = 999999
-                            
-                        validated_proxies.append(proxy)
-                    except Exception as e:
-                        logger.error(f"处理验证结果失败: {str(e)}")
-                        continue
-                    
-                processed_count += len(chunk_proxies)
-                logger.info(f"验证进度: {processed_count}/{total_count}, 当前有效: {valid_count}")
-                
-            except Exception as e:
-                logger.error(f"验证代理批次失败: {str(e)}")
-                continue
-                
-            # 短暂暂停，避免请求过于频繁
-            await asyncio.sleep(1)
-            
+        async for proxy in self.iter_validate(proxies):
+            validated_proxies.append(proxy)
+            if proxy.is_valid:
+                valid_count += 1
+            if len(validated_proxies) % 1000 == 0:
+                logger.info(f"验证进度: {len(validated_proxies)}/{total_count}, 当前有效: {valid_count}")
+
         logger.info(f"代理验证完成，{valid_count}/{total_count} 个有效")
-        return validated_proxies 
\ No newline at end of file
+        return validated_proxies
@@ -0,0 +1,98 @@
+"""依次运行全部基准并把结果汇总成一个JSON，用于跟踪性能回退
+
+每个基准在独立的子进程中运行，互不影响；单个基准失败不影响其他基准，错误记录在结果里。
+
+用法: python -m benchmarks                       # 快速档，几分钟内跑完
+      python -m benchmarks --profile full        # README 中的完整参数
+      python -m benchmarks --only e2e api --output results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from .bench_e2e import REPO_DIR, run_metadata
+
+# 基准名 -> {档位: 命令行参数}
+SUITE = {
+    'validator': {'quick': ['--checks', '2000'], 'full': ['--checks', '5000']},
+    'pipeline': {'quick': ['--checks', '1000'], 'full': ['--checks', '2000']},
+    'upsert': {'quick': ['--sizes', '10000', '50000'], 'full': ['--sizes', '10000', '100000', '500000']},
+    'api': {'quick': ['--rows', '5000', '--requests', '100'], 'full': ['--rows', '20000', '--requests', '500']},
+    'strategies': {'quick': ['--picks', '50000'], 'full': ['--picks', '200000']},
+    'crawler': {'quick': ['--sources', '10', '--latency', '0.2'], 'full': ['--sources', '25', '--latency', '0.5']},
+    'sources': {'quick': ['--hours', '12'], 'full': []},
+    'profiles': {'quick': ['--live', '100', '--profiles', '3'], 'full': []},
+    'anonymity': {'quick': ['--per-group', '50'], 'full': []},
+    'parser': {'quick': ['--lines', '200000'], 'full': ['--lines', '1000000']},
+    'memory': {'quick': ['--lines', '50000', '200000'], 'full': ['--lines', '50000', '200000', '500000']},
+    'prefilter': {'quick': ['--checks', '1000'], 'full': ['--checks', '3000']},
+    'scoring': {'quick': [], 'full': []},
+    'scheduler': {'quick': ['--duration', '20'], 'full': ['--duration', '40']},
+    'writeback': {'quick': ['--rows', '50000'], 'full': ['--rows', '200000']},
+    'negative_cache': {'quick': ['--cycles', '6'], 'full': []},
+    'boot': {'quick': ['--rows', '20000'], 'full': ['--rows', '100000']},
+    'snapshot': {'quick': ['--size', '50000', '--rounds', '2'], 'full': []},
+    'e2e': {'quick': ['--requests', '200'], 'full': []},
+}
+
+
+def raise_fd_limit():
+    # 预检和端到端基准会同时打开上千个连接
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = hard if hard != resource.RLIM_INFINITY else 65536
+        if soft < target:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def run_one(name: str, argv: list, timeout: float) -> dict:
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(
+            [sys.executable, '-m', f'benchmarks.bench_{name}', *argv],
+            cwd=REPO_DIR, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'status': 'timeout', 'seconds': round(time.perf_counter() - start, 1)}
+    seconds = round(time.perf_counter() - start, 1)
+    if completed.returncode != 0:
+        return {'status': 'error', 'seconds': seconds, 'stderr': completed.stderr[-2000:]}
+    try:
+        result = json.loads(completed.stdout)
+    except ValueError:
+        return {'status': 'error', 'seconds': seconds, 'stderr': 'invalid JSON output'}
+    return {'status': 'ok', 'seconds': seconds, 'args': argv, 'result': result}
+
+
+def main(args):
+    raise_fd_limit()
+    names = args.only or list(SUITE)
+    report = {'meta': run_metadata(args), 'benchmarks': {}}
+    for name in names:
+        print(f"running {name} ...", file=sys.stderr, flush=True)
+        report['benchmarks'][name] = outcome = run_one(name, SUITE[name][args.profile], args.timeout)
+        print(f"  {outcome['status']} in {outcome['seconds']}s", file=sys.stderr, flush=True)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0 if all(item['status'] == 'ok' for item in report['benchmarks'].values()) else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--profile', choices=('quick', 'full'), default='quick')
+    parser.add_argument('--only', nargs='+', choices=list(SUITE), metavar='NAME',
+                        help=f"只运行指定的基准：{', '.join(SUITE)}")
+    parser.add_argument('--output', help='结果写入该文件，默认输出到标准输出')
+    parser.add_argument('--timeout', type=float, default=900, help='单个基准的超时时间(秒)')
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    sys.exit(main(args))
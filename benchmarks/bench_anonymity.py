@@ -0,0 +1,81 @@
+"""匿名度和出口IP检测基准：普通验证地址 vs 回显地址
+
+替身代理分为透明、匿名、高匿几组，每组若干个代理共用同一个出口地址。分别用普通验证地址和回显地址
+各做一次完整刷新，比较验证请求数和耗时(回显不应增加请求)，统计匿名度判断的准确率，
+以及批量租用时按出口IP去重前后拿到的不同出口数。
+
+用法: python -m benchmarks.bench_anonymity --per-group 100 --egress-ips 10 --lease 50
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from app.core.index import Strategy
+from app.core.pool import ProxyPool
+from .standins import spawn_fleet
+
+GROUPS = ('transparent', 'anonymous', 'elite')
+
+
+async def run(mode: str, args, target_url: str, lists: dict, expected: dict) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ProxyPool(data_dir=tmp)
+        pool.crawler.sources = {
+            'bench': {'urls': {url: protocol for protocol, url in lists.items()},
+                      'parser': pool.crawler.parse_proxylist}
+        }
+        pool.validator.test_url = target_url
+        if mode == 'echo':
+            pool.validator.echo_url = f"{target_url}echo"
+        pool.validator.timeout = args.timeout
+        try:
+            start = time.perf_counter()
+            await pool.refresh_proxies()
+            seconds = time.perf_counter() - start
+            checks = pool.validator.stats.counts['check']
+            proxies = await pool.load_proxies(valid_only=True)
+            correct = sum(1 for proxy in proxies if proxy.anonymity == expected.get(proxy.port))
+            leases = {}
+            for name, options in (('plain', {}), ('distinct_egress', {'distinct_egress': True}),
+                                  ('anonymous_distinct', {'anonymity': 'anonymous', 'distinct_egress': True})):
+                leased = pool.lease_proxies(args.lease, Strategy.WEIGHTED, **options)
+                leases[name] = {
+                    'leased': len(leased),
+                    'egress_ips': len({proxy['egress_ip'] or proxy['host'] for proxy in leased}),
+                    'transparent': sum(1 for proxy in leased if proxy['anonymity'] == 'transparent'),
+                }
+        finally:
+            await pool.close()
+    return {
+        'mode': mode,
+        'seconds': round(seconds, 3),
+        'checks': checks['passed'] + checks['failed'],
+        'valid': len(proxies),
+        'classified_correctly': correct,
+        'leases': leases if mode == 'echo' else None,
+    }
+
+
+async def main(args):
+    groups = [{'count': args.per_group, 'protocol': 'http', 'latency': 0.02, 'anonymity': level,
+               'egress_ips': args.egress_ips} for level in GROUPS]
+    process, target_url, lists, fleet = spawn_fleet(groups, refused=args.refused)
+    # 端口 -> 预期的匿名度；验证器和替身代理在同一台机器上，本机IP是 127.0.0.1
+    expected = {port: level for level, ports in zip(GROUPS, fleet) for port in ports}
+    try:
+        results = [await run(mode, args, target_url, lists, expected) for mode in ('test_url', 'echo')]
+    finally:
+        process.terminate()
+    print(json.dumps({'benchmark': 'anonymity', 'per_group': args.per_group, 'egress_ips': args.egress_ips,
+                      'refused': args.refused, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--per-group', type=int, default=100)
+    parser.add_argument('--egress-ips', type=int, default=10, help='每组代理共用的出口地址数')
+    parser.add_argument('--refused', type=int, default=100)
+    parser.add_argument('--lease', type=int, default=50)
+    parser.add_argument('--timeout', type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""/proxy 接口延迟基准：数据库 ORDER BY 查询 vs 内存排序索引
+
+可选在压测期间用后台线程模拟刷新写回(批量upsert + 索引更新)，
+检查刷新进行时接口延迟是否稳定。
+
+用法: python -m benchmarks.bench_api --rows 20000 --requests 500 --concurrency 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import httpx
+from .standins import run_in_tempdir
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def load(client: httpx.AsyncClient, path: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': total,
+        'requests_per_second': round(total / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+def writer(pool, proxies: list, stop: threading.Event):
+    # 模拟刷新过程：持续批量写回并逐个更新内存索引
+    rng = random.Random(1)
+    db = pool.SessionLocal()
+    try:
+        while not stop.is_set():
+            batch = rng.sample(proxies, 1000)
+            for proxy in batch:
+                proxy.response_time = rng.uniform(0.1, 5)
+                proxy.is_valid = rng.random() > 0.1
+                pool.index.update(proxy)
+            pool.upsert_proxies(batch, db)
+    finally:
+        db.close()
+
+
+async def main(args):
+    from fastapi import Depends
+    from app.core.models import Proxy
+    from app.core.pool import ProxyPool
+    import app.api.main as api
+    from datetime import datetime
+
+    pool = ProxyPool(db_url=f"sqlite:///{os.path.join(args.tmp, 'bench.db')}")
+    rng = random.Random(0)
+    proxies = [
+        Proxy(host=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", port=8080, protocol='http',
+              source='bench', response_time=rng.uniform(0.1, 5), is_valid=True, fail_count=0,
+              last_check=datetime.utcnow())
+        for i in range(args.rows)
+    ]
+    db = pool.SessionLocal()
+    pool.upsert_proxies(proxies, db)
+    db.close()
+    pool.reload_index()
+    api.proxy_pool = pool
+
+    @api.app.get('/bench/legacy-proxy')
+    def legacy_proxy(db=Depends(api.get_db)):
+        # 旧实现：每次请求按 response_time 排序查询整表
+        from sqlalchemy import select
+        stmt = select(Proxy).where(Proxy.is_valid == True).order_by(Proxy.response_time.asc())
+        proxy = db.execute(stmt).scalar()
+        return proxy.to_dict() if proxy else {}
+
+    results = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for mode, path in (('db', '/bench/legacy-proxy'), ('index', '/proxy')):
+            for refreshing in (False, True):
+                stop = threading.Event()
+                thread = None
+                if refreshing:
+                    thread = threading.Thread(target=writer, args=(pool, proxies, stop), daemon=True)
+                    thread.start()
+                try:
+                    result = await load(client, path, args.requests, args.concurrency)
+                finally:
+                    stop.set()
+                    if thread is not None:
+                        thread.join()
+                results.append({'mode': mode, 'refreshing': refreshing, **result})
+    print(json.dumps({'benchmark': 'api', 'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=500)
+    # 旧实现每个请求占用一个数据库连接，并发超过连接池上限(15)会排队超时
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+    run_in_tempdir(main, args)
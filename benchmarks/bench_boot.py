@@ -0,0 +1,115 @@
+"""启动耗时基准：冷启动(从数据库加载索引) vs 热启动(从索引快照加载)
+
+启动一个独立的uvicorn进程，记录从进程启动到服务开始响应、到 /proxy 第一次返回代理的时间，
+以及在当前进程中构造 ProxyPool(加载索引)的耗时。冷启动时服务要等索引从数据库加载完才开始响应。
+
+用法: python -m benchmarks.bench_boot --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(data_dir: str, rows: int):
+    from app.core.models import Proxy
+    from app.core.pool import ProxyPool
+    from app.core.scoring import record_check
+
+    pool = ProxyPool(data_dir=data_dir)
+    rng = random.Random(0)
+    proxies = []
+    for i in range(rows):
+        proxy = Proxy(host=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", port=8080, protocol='http',
+                      source='bench', is_valid=True, fail_count=0,
+                      last_check=datetime.utcnow() - timedelta(seconds=rng.uniform(0, 3 * 3600)))
+        record_check(proxy, True, rng.uniform(0.1, 5))
+        proxies.append(proxy)
+    db = pool.SessionLocal()
+    pool.upsert_proxies(proxies, db)
+    db.close()
+    pool.reload_index()
+    return pool
+
+
+def time_to_first_proxy(data_dir: str, timeout: float) -> tuple:
+    """返回 (服务开始响应的耗时, /proxy 第一次返回代理的耗时)"""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd(), os.environ.get('PYTHONPATH', '')]))
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.api.main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.dirname(data_dir), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server_up = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                response = httpx.get(f'http://127.0.0.1:{port}/proxy', timeout=1)
+                if server_up is None:
+                    server_up = time.perf_counter() - start
+                if 'host' in response.json():
+                    return server_up, time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.005)
+        return server_up, float('inf')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(args):
+    from app.core.pool import ProxyPool
+    from app.core.snapshot import write_snapshot
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # 服务进程在 tmp 下运行，默认的 data/ 目录即 tmp/data
+        data_dir = os.path.join(tmp, 'data')
+        pool = seed(data_dir, args.rows)
+        snapshot_path = pool.snapshot_path
+        records = pool.index.dump()
+        def prepare(mode: str):
+            if mode == 'warm':
+                write_snapshot(snapshot_path, records)
+            elif os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+        for mode in ('cold', 'warm'):
+            prepare(mode)
+            server_up, first_proxy = time_to_first_proxy(data_dir, args.timeout)
+            # 服务进程退出时会写出快照，重新准备一次
+            prepare(mode)
+            start = time.perf_counter()
+            loaded = ProxyPool(data_dir=data_dir)
+            load_seconds = time.perf_counter() - start
+            # 热启动时其余部分在后台补齐，这里记录构造完成时已能分配的数量
+            ready = len(loaded.index)
+            results.append({
+                'mode': mode,
+                'ready_at_boot': ready,
+                'pool_init_ms': round(load_seconds * 1000, 1),
+                'server_up_ms': round(server_up * 1000, 1) if server_up else None,
+                'first_proxy_ms': round(first_proxy * 1000, 1),
+            })
+    print(json.dumps({'benchmark': 'boot', 'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--timeout', type=float, default=60)
+    main(parser.parse_args())
@@ -0,0 +1,157 @@
+"""端到端基准：本地列表服务 + 可编程代理集群 + 验证目标，完整跑一遍爬取、验证、刷新和接口
+
+代理按协议分组，每组可以设置延迟、抖动、失败率和超时率；http列表里另外混入拒绝连接和
+连接超时的死代理。依次测量：
+- ProxyCrawler.crawl
+- ProxyValidator.validate_proxies
+- ProxyPool.refresh_proxies(爬取 -> 验证 -> 写库 -> 重建索引)
+- FastAPI接口：/proxy、/proxy?count=、/proxies、/stats、/metrics
+
+用法: python -m benchmarks.bench_e2e --http 200 --socks5 50 --socks4 20 --refused 500 --blackholes 50
+      python -m benchmarks.bench_e2e --fleet fleet.json   # 自定义分组，格式见 standins.spawn_fleet
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from collections import Counter
+from datetime import datetime
+import httpx
+from .bench_api import load
+from .standins import run_in_tempdir, spawn_fleet
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_metadata(args) -> dict:
+    """记录运行环境，便于比较不同时间的结果"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': {key: value for key, value in vars(args).items() if key != 'tmp'},
+    }
+
+
+def fleet_groups(args) -> list:
+    if args.fleet:
+        with open(args.fleet) as f:
+            return json.load(f)
+    common = dict(latency=args.latency, jitter=args.jitter,
+                  failure_rate=args.failure_rate, timeout_rate=args.timeout_rate)
+    return [
+        dict(common, count=count, protocol=protocol)
+        for protocol, count in (('http', args.http), ('socks5', args.socks5), ('socks4', args.socks4))
+        if count
+    ]
+
+
+async def main(args):
+    from app.core.crawler import ProxyCrawler
+    from app.core.validator import ProxyValidator
+    import app.api.main as api
+
+    groups = fleet_groups(args)
+    process, target_url, lists, _ = spawn_fleet(groups, refused=args.refused, blackholes=args.blackholes)
+    pool = api.proxy_pool
+    stages = {}
+    try:
+        def configure_crawler(crawler: ProxyCrawler):
+            crawler.sources = {
+                'bench': {'urls': {url: protocol for protocol, url in lists.items()},
+                          'parser': crawler.parse_proxylist}
+            }
+
+        def configure_validator(validator: ProxyValidator):
+            validator.test_url = target_url
+            validator.timeout = args.timeout
+            validator.precheck_timeout = args.precheck_timeout
+            validator.concurrency = args.concurrency
+
+        # 1. 爬取
+        crawler = ProxyCrawler()
+        configure_crawler(crawler)
+        start = time.perf_counter()
+        crawled = await crawler.crawl()
+        stages['crawl'] = {
+            'seconds': round(time.perf_counter() - start, 3),
+            'proxies': len(crawled),
+            'by_protocol': dict(Counter(proxy.protocol for proxy in crawled)),
+        }
+        await crawler.close()
+
+        # 2. 验证
+        validator = ProxyValidator()
+        configure_validator(validator)
+        start = time.perf_counter()
+        validated = await validator.validate_proxies(crawled)
+        elapsed = time.perf_counter() - start
+        await validator.close()
+        stages['validate'] = {
+            'seconds': round(elapsed, 3),
+            'checks': len(validated),
+            'valid': sum(1 for proxy in validated if proxy.is_valid),
+            'checks_per_second': round(len(validated) / elapsed, 1) if elapsed else None,
+            'valid_by_protocol': dict(Counter(proxy.protocol for proxy in validated if proxy.is_valid)),
+            'stages': validator.stats.to_dict(),
+        }
+
+        # 3. 完整刷新：爬取、验证新代理和库中已有代理、写库、重建索引
+        configure_crawler(pool.crawler)
+        configure_validator(pool.validator)
+        for cycle in range(args.refresh_cycles):
+            start = time.perf_counter()
+            await pool.refresh_proxies()
+            stages[f'refresh_{cycle + 1}'] = {
+                'seconds': round(time.perf_counter() - start, 3),
+                'indexed': len(pool.index),
+            }
+
+        # 4. 接口
+        endpoints = ['/proxy', '/proxy?count=10', '/proxies?limit=100', '/stats', '/metrics']
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            stages['api'] = {
+                path: await load(client, path, args.requests, args.api_concurrency)
+                for path in endpoints
+            }
+    finally:
+        await pool.close()
+        process.terminate()
+
+    print(json.dumps({'benchmark': 'e2e', 'meta': run_metadata(args), 'fleet': groups,
+                      'results': stages}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--http', type=int, default=200)
+    parser.add_argument('--socks5', type=int, default=50)
+    parser.add_argument('--socks4', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--failure-rate', type=float, default=0.1)
+    parser.add_argument('--timeout-rate', type=float, default=0.05)
+    parser.add_argument('--refused', type=int, default=500)
+    parser.add_argument('--blackholes', type=int, default=50)
+    parser.add_argument('--fleet', help='代理分组的JSON文件，指定后忽略上面的代理参数')
+    parser.add_argument('--timeout', type=int, default=2)
+    parser.add_argument('--precheck-timeout', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--refresh-cycles', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--api-concurrency', type=int, default=10)
+    args = parser.parse_args()
+    if args.fleet:
+        args.fleet = os.path.abspath(args.fleet)
+    run_in_tempdir(main, args)
@@ -0,0 +1,102 @@
+"""爬取内存基准：每行一个ORM实例 vs __slots__ 候选记录 + 打包整数key去重
+
+本地列表服务提供若干个列表，其中一半与另一半内容相同，模拟各代理源之间的大量重复。
+每种模式、每个规模在独立子进程中运行，记录爬取并加入复查队列后的峰值RSS、
+相对爬取前的增量、耗时和GC次数。
+
+用法: python -m benchmarks.bench_memory --lines 50000 200000 500000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import resource
+import subprocess
+import sys
+import time
+from .standins import make_proxy_list, start_list_server
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 的单位是KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def legacy_crawl(crawler) -> list:
+    # 旧实现：每个解析出的代理先建一个ORM实例，全部建完后再按元组key去重
+    from app.core.models import Proxy
+
+    all_proxies = []
+    for source_name, source_info in crawler.sources.items():
+        for url in source_info['urls']:
+            for host, port, protocol in await crawler.crawl_url(source_name, url):
+                all_proxies.append(Proxy(host=host, port=port, protocol=protocol, source=source_name))
+    unique_proxies, seen = [], set()
+    for proxy in all_proxies:
+        key = (proxy.host, proxy.port, proxy.protocol)
+        if key not in seen:
+            seen.add(key)
+            unique_proxies.append(proxy)
+    return unique_proxies
+
+
+async def run_child(mode: str, lines: int, sources: int):
+    from app.core.crawler import ProxyCrawler
+    from app.core.scheduler import RevalidationScheduler
+
+    per_list = lines // sources
+    # 后一半列表重复前一半的内容
+    lists = {f"/list{i}.txt": make_proxy_list(per_list, seed=i % max(1, sources // 2)) for i in range(sources)}
+    runner, base_url, _ = await start_list_server(lists)
+    try:
+        crawler = ProxyCrawler()
+        crawler.sources = {
+            f'source{i}': {'urls': {base_url + path: 'http'}, 'parser': crawler.parse_proxylist}
+            for i, path in enumerate(lists)
+        }
+        scheduler = RevalidationScheduler()
+        gc.collect()
+        before = peak_rss_mb()
+        collections = sum(stat['collections'] for stat in gc.get_stats())
+        start = time.perf_counter()
+        proxies = await (legacy_crawl(crawler) if mode == 'orm' else crawler.crawl())
+        # 爬取结果会一直留在复查队列里直到验证，这部分内存同样计入
+        scheduler.add_new(proxies)
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mb()
+        await crawler.close()
+    finally:
+        await runner.cleanup()
+    return {
+        'mode': mode,
+        'lines': per_list * sources,
+        'unique': len(proxies),
+        'elapsed': round(elapsed, 3),
+        'peak_rss_mb': round(peak, 1),
+        'rss_growth_mb': round(peak - before, 1),
+        'gc_collections': sum(stat['collections'] for stat in gc.get_stats()) - collections,
+    }
+
+
+def main(args):
+    results = []
+    for lines in args.lines:
+        for mode in ('orm', 'slots'):
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_memory', '--child', mode,
+                 '--lines', str(lines), '--sources', str(args.sources)],
+                capture_output=True, text=True, check=True)
+            results.append(json.loads(completed.stdout))
+    print(json.dumps({'benchmark': 'memory', 'sources': args.sources, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, nargs='+', default=[50000, 200000, 500000])
+    parser.add_argument('--sources', type=int, default=8)
+    parser.add_argument('--child', choices=('orm', 'slots'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(run_child(args.child, args.lines[0], args.sources))))
+    else:
+        main(args)
@@ -0,0 +1,76 @@
+"""失效代理缓存基准：公开列表每轮都带回同一批死代理时，连续多轮 refresh_proxies 的耗时和验证次数
+
+列表里混入连接被拒绝和连接超时的地址，连续失败超过 MAX_FAIL_COUNT 次后被清理；
+不用缓存时下一轮爬取又把它们当新代理验证一遍。
+
+用法: python -m benchmarks.bench_negative_cache --live 100 --refused 300 --blackholes 200 --cycles 8
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from app.core.negative_cache import NegativeCache
+from app.core.pool import ProxyPool
+from .standins import spawn_fleet
+
+
+async def run(mode: str, args, target_url: str, lists: dict) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ProxyPool(data_dir=tmp)
+        if mode == 'no_cache':
+            # 容量为0：加入后立即被淘汰
+            pool.dead = NegativeCache(capacity=0)
+        pool.crawler.sources = {
+            'bench': {'urls': {url: protocol for protocol, url in lists.items()},
+                      'parser': pool.crawler.parse_proxylist}
+        }
+        pool.validator.test_url = target_url
+        pool.validator.timeout = args.timeout
+        pool.validator.precheck_timeout = args.precheck_timeout
+        cycles = []
+        try:
+            for cycle in range(args.cycles):
+                checks = sum(stage['passed'] + stage['failed'] for stage in pool.validator.stats.counts.values())
+                skipped = pool.dead.skipped
+                start = time.perf_counter()
+                await pool.refresh_proxies()
+                cycles.append({
+                    'cycle': cycle + 1,
+                    'seconds': round(time.perf_counter() - start, 3),
+                    'checks': sum(stage['passed'] + stage['failed']
+                                  for stage in pool.validator.stats.counts.values()) - checks,
+                    'skipped': pool.dead.skipped - skipped,
+                    'indexed': len(pool.index),
+                })
+        finally:
+            await pool.close()
+    return {
+        'mode': mode,
+        'total_seconds': round(sum(cycle['seconds'] for cycle in cycles), 3),
+        'total_checks': sum(cycle['checks'] for cycle in cycles),
+        'cycles': cycles,
+    }
+
+
+async def main(args):
+    process, target_url, lists, _ = spawn_fleet(
+        [{'count': args.live, 'protocol': 'http', 'latency': 0.02}],
+        refused=args.refused, blackholes=args.blackholes)
+    try:
+        results = [await run(mode, args, target_url, lists) for mode in ('no_cache', 'cache')]
+    finally:
+        process.terminate()
+    print(json.dumps({'benchmark': 'negative_cache', 'live': args.live, 'refused': args.refused,
+                      'blackholes': args.blackholes, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--live', type=int, default=100)
+    parser.add_argument('--refused', type=int, default=300)
+    parser.add_argument('--blackholes', type=int, default=200)
+    parser.add_argument('--cycles', type=int, default=8)
+    parser.add_argument('--timeout', type=int, default=2)
+    parser.add_argument('--precheck-timeout', type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
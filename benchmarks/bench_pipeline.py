@@ -0,0 +1,75 @@
+"""验证流水线基准：对比旧的分批(200个一批+sleep 1秒)和流式有界并发两种调度
+
+部分代理被模拟为不响应的死代理，每个都会耗满超时时间。
+
+用法: python -m benchmarks.bench_pipeline --checks 2000 --dead-ratio 0.1 --timeout 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from app.core.models import Proxy
+from app.core.validator import ProxyValidator
+from .standins import spawn_standins
+
+
+async def legacy_validate_proxies(validator: ProxyValidator, proxies: list, chunk_size: int = 200):
+    # 旧实现的调度方式：整批gather，等最慢的一个结束后再sleep 1秒
+    for i in range(0, len(proxies), chunk_size):
+        chunk = proxies[i:i + chunk_size]
+        results = await asyncio.gather(*(validator.validate_proxy(p) for p in chunk))
+        for proxy, result in zip(chunk, results):
+            validator._apply_result(proxy, result)
+        await asyncio.sleep(1)
+    return proxies
+
+
+async def streaming_validate_proxies(validator: ProxyValidator, proxies: list):
+    return [proxy async for proxy in validator.iter_validate(proxies)]
+
+
+async def main(args):
+    dead_count = max(1, args.proxies // 10)
+    process, target_url, ports, dead_ports = spawn_standins(args.proxies, dead_count=dead_count)
+    rng = random.Random(42)
+    proxies = []
+    for _ in range(args.checks):
+        port = rng.choice(dead_ports) if rng.random() < args.dead_ratio else rng.choice(ports)
+        proxies.append(Proxy(host='127.0.0.1', port=port, protocol='http'))
+
+    results = []
+    try:
+        for mode, run in (('chunked', legacy_validate_proxies), ('streaming', streaming_validate_proxies)):
+            validator = ProxyValidator(timeout=args.timeout, test_url=target_url,
+                                       concurrency=args.concurrency, limit=args.concurrency * 2)
+            start = time.perf_counter()
+            try:
+                validated = await run(validator, [Proxy(host=p.host, port=p.port, protocol=p.protocol)
+                                                  for p in proxies])
+            finally:
+                await validator.close()
+            elapsed = time.perf_counter() - start
+            results.append({
+                'mode': mode,
+                'checks': len(validated),
+                'valid': sum(1 for p in validated if p.is_valid),
+                'elapsed': round(elapsed, 3),
+                'checks_per_second': round(len(validated) / elapsed, 1),
+            })
+    finally:
+        process.terminate()
+    # 理想耗时: 总数 / 并发 × 平均耗时
+    ideal = args.checks / args.concurrency * (args.dead_ratio * args.timeout)
+    print(json.dumps({'benchmark': 'pipeline', 'ideal_elapsed': round(ideal, 3),
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checks', type=int, default=2000)
+    parser.add_argument('--proxies', type=int, default=50)
+    parser.add_argument('--dead-ratio', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--timeout', type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""两阶段验证基准：只做完整验证 vs 先TCP预检再完整验证
+
+代理由三类组成：可用代理、可连接但不响应的代理、TCP都连不上的黑洞代理(大多数)。
+
+用法: python -m benchmarks.bench_prefilter --checks 3000 --blackhole-ratio 0.7 --hang-ratio 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from app.core.models import Proxy
+from app.core.validator import ProxyValidator
+from .standins import open_blackholes, spawn_standins
+
+
+async def main(args):
+    process, target_url, ports, hang_ports = spawn_standins(50, dead_count=20)
+    holes = open_blackholes(200)
+    hole_ports = [server.getsockname()[1] for server, _ in holes]
+    rng = random.Random(7)
+    endpoints = []
+    for _ in range(args.checks):
+        roll = rng.random()
+        if roll < args.blackhole_ratio:
+            endpoints.append(rng.choice(hole_ports))
+        elif roll < args.blackhole_ratio + args.hang_ratio:
+            endpoints.append(rng.choice(hang_ports))
+        else:
+            endpoints.append(rng.choice(ports))
+
+    results = []
+    try:
+        for mode, precheck_timeout in (('single_stage', 0), ('two_stage', args.precheck_timeout)):
+            validator = ProxyValidator(timeout=args.timeout, test_url=target_url,
+                                       concurrency=args.concurrency,
+                                       precheck_timeout=precheck_timeout)
+            proxies = [Proxy(host='127.0.0.1', port=port, protocol='http') for port in endpoints]
+            start = time.perf_counter()
+            try:
+                valid = sum(1 for proxy in await validator.validate_proxies(proxies) if proxy.is_valid)
+            finally:
+                await validator.close()
+            results.append({
+                'mode': mode,
+                'checks': len(proxies),
+                'valid': valid,
+                'elapsed': round(time.perf_counter() - start, 3),
+                'stages': validator.stats.to_dict(),
+            })
+    finally:
+        process.terminate()
+    print(json.dumps({'benchmark': 'prefilter', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checks', type=int, default=3000)
+    parser.add_argument('--blackhole-ratio', type=float, default=0.7)
+    parser.add_argument('--hang-ratio', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--timeout', type=int, default=5)
+    parser.add_argument('--precheck-timeout', type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
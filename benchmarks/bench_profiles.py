@@ -0,0 +1,94 @@
+"""验证配置基准：N 个目标站点各跑一遍完整验证 vs 在默认验证后顺带检查各配置
+
+列表中混入连接被拒绝和连接超时的地址。separate 为每个目标各建一个池、各自完整爬取和验证一遍
+(相当于为每个站点单独部署)；profiles 为一个池配置 N 个验证配置，只对通过默认验证的代理检查。
+
+用法: python -m benchmarks.bench_profiles --live 200 --refused 300 --blackholes 200 --profiles 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from sqlalchemy import func, select
+from app.core.models import ProxyProfile
+from app.core.pool import ProxyPool
+from .standins import spawn_fleet
+
+
+def checks_of(pool: ProxyPool) -> int:
+    return sum(stage['passed'] + stage['failed'] for stage in pool.validator.stats.counts.values())
+
+
+async def refresh_once(args, test_url: str, lists: dict, profiles: list = None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        if profiles:
+            with open(os.path.join(tmp, 'profiles.json'), 'w') as f:
+                json.dump(profiles, f)
+        pool = ProxyPool(data_dir=tmp)
+        pool.crawler.sources = {
+            'bench': {'urls': {url: protocol for protocol, url in lists.items()},
+                      'parser': pool.crawler.parse_proxylist}
+        }
+        pool.validator.test_url = test_url
+        pool.validator.timeout = args.timeout
+        pool.validator.precheck_timeout = args.precheck_timeout
+        try:
+            start = time.perf_counter()
+            await pool.refresh_proxies()
+            seconds = time.perf_counter() - start
+            db = pool.SessionLocal()
+            try:
+                profile_checks = db.execute(select(func.count()).select_from(ProxyProfile)).scalar()
+            finally:
+                db.close()
+            return {
+                'seconds': seconds,
+                'checks': checks_of(pool),
+                'profile_checks': profile_checks,
+                'indexed': {name: len(index) for name, index in pool.profile_indexes.items()}
+                or {'default': len(pool.index)},
+            }
+        finally:
+            await pool.close()
+
+
+async def main(args):
+    process, target_url, lists, _ = spawn_fleet(
+        [{'count': args.live, 'protocol': 'http', 'latency': 0.02}],
+        refused=args.refused, blackholes=args.blackholes)
+    profiles = [{'name': f'site{i}', 'url': f'{target_url}site{i}', 'timeout': args.timeout}
+                for i in range(args.profiles)]
+    try:
+        runs = [await refresh_once(args, profile['url'], lists) for profile in profiles]
+        separate = {
+            'mode': 'separate',
+            'seconds': round(sum(run['seconds'] for run in runs), 3),
+            'checks': sum(run['checks'] for run in runs),
+            'indexed': {profile['name']: run['indexed']['default'] for profile, run in zip(profiles, runs)},
+        }
+        run = await refresh_once(args, target_url, lists, profiles)
+        combined = {
+            'mode': 'profiles',
+            'seconds': round(run['seconds'], 3),
+            'checks': run['checks'],
+            'profile_checks': run['profile_checks'],
+            'indexed': run['indexed'],
+        }
+    finally:
+        process.terminate()
+    print(json.dumps({'benchmark': 'profiles', 'live': args.live, 'refused': args.refused,
+                      'blackholes': args.blackholes, 'profiles': args.profiles,
+                      'results': [separate, combined]}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--live', type=int, default=200)
+    parser.add_argument('--refused', type=int, default=300)
+    parser.add_argument('--blackholes', type=int, default=200)
+    parser.add_argument('--profiles', type=int, default=4)
+    parser.add_argument('--timeout', type=int, default=2)
+    parser.add_argument('--precheck-timeout', type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
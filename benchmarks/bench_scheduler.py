@@ -0,0 +1,74 @@
+"""复查调度基准：按到期时间持续复查，观察稳态每秒检查数和可分配代理的陈旧程度
+
+为了在短时间内看到稳态，调度间隔按比例压缩(默认基础间隔10秒)。
+整个过程一次检查都没有完成时(通常是替身爬虫和 pool 的调用方式不一致)以非零状态退出。
+
+用法: python -m benchmarks.bench_scheduler --proxies 500 --dead-ratio 0.3 --duration 40 --budget 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from app.core.candidate import ProxyCandidate
+from app.core.pool import ProxyPool
+from app.core.scheduler import RevalidationScheduler
+from .standins import spawn_standins
+
+
+async def main(args):
+    dead_count = int(args.proxies * args.dead_ratio)
+    process, target_url, ports, dead_ports = spawn_standins(args.proxies - dead_count, dead_count=dead_count)
+    endpoints = ports + dead_ports
+
+    db_dir = tempfile.mkdtemp()
+    pool = ProxyPool(f"sqlite:///{os.path.join(db_dir, 'proxies.db')}",
+                     crawl_interval=args.duration * 2, validation_budget=args.budget, data_dir=db_dir)
+    pool.scheduler = RevalidationScheduler(base_interval=args.base_interval,
+                                           min_interval=args.base_interval / 5,
+                                           max_interval=args.base_interval * 6,
+                                           slow_latency=0.5)
+    pool.validator.test_url = target_url
+    pool.validator.timeout = 3
+
+    async def crawl(force: bool = True):
+        return [ProxyCandidate('127.0.0.1', port, 'http', 'bench') for port in endpoints]
+
+    pool.crawler.crawl = crawl
+    # 只有一个替身来源，不按来源通过率推迟新代理，否则压缩后的整个时长内都还没到期
+    pool.crawler.tracker.priority_spread = 0
+    samples = []
+    service = asyncio.create_task(pool.start())
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < args.duration:
+            await asyncio.sleep(args.sample_interval)
+            stats = pool.schedule_stats()
+            samples.append({
+                'elapsed': round(time.perf_counter() - start, 1),
+                'available': len(pool.index),
+                **stats['scheduler'],
+                'staleness': stats['staleness'],
+            })
+    finally:
+        service.cancel()
+        await service
+        await pool.close()
+        process.terminate()
+    print(json.dumps({'benchmark': 'scheduler', 'proxies': args.proxies,
+                      'budget': args.budget, 'samples': samples}, indent=2))
+    if not samples or samples[-1]['total_checks'] == 0:
+        sys.exit("没有完成任何检查，基准本身没有正常运行")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--proxies', type=int, default=500)
+    parser.add_argument('--dead-ratio', type=float, default=0.3)
+    parser.add_argument('--duration', type=float, default=40)
+    parser.add_argument('--budget', type=int, default=100)
+    parser.add_argument('--base-interval', type=float, default=10)
+    parser.add_argument('--sample-interval', type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,135 @@
+"""索引快照基准：主进程写快照、跟随进程加载快照期间，事件循环上取代理的延迟
+
+模拟 /proxy 的请求每毫秒让出一次事件循环，每轮先更新主进程索引中的一部分代理，
+再分别测量主进程写出、跟随进程加载期间事件循环的停顿。
+- on_loop: 修改前的做法，导出和构造新状态在事件循环上进行(只有文件读写放到线程)
+- threaded: 每轮重写完整快照，导出、序列化、解析和构造新状态都在线程中
+- journal: 当前实现，只把变化追加到变化日志，跟随进程只应用新追加的部分
+
+用法: python -m benchmarks.bench_snapshot --size 100000 --changes 1000 --rounds 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from app.core.candidate import ProxyCandidate
+from app.core.index import ProxyIndex, _Entry
+from app.core.snapshot import append_journal, read_journal, read_snapshot, read_snapshot_with_header, write_snapshot
+
+
+def make_proxies(size: int) -> list:
+    now = datetime.utcnow()
+    proxies = []
+    for i in range(size):
+        proxy = ProxyCandidate(f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", 8080, 'http', 'bench')
+        proxy.id = i + 1
+        proxy.is_valid = True
+        proxy.last_check = now
+        proxy.score = 0.1 + (i % 1000) / 100
+        proxies.append(proxy)
+    return proxies
+
+
+async def measure(work, gaps: list):
+    """work 运行期间每毫秒让出一次事件循环，把超出1毫秒的等待时间(毫秒)加入 gaps"""
+    task = asyncio.create_task(work())
+    while not task.done():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        gaps.append((time.perf_counter() - start) * 1000 - 1)
+    await task
+
+
+def summarize(gaps: list, seconds: float) -> dict:
+    gaps = sorted(gaps)
+    return {
+        'seconds': round(seconds, 2),
+        'p50_ms': round(gaps[len(gaps) // 2], 2),
+        'p99_ms': round(gaps[int(len(gaps) * 0.99)], 2),
+        'max_ms': round(gaps[-1], 2),
+    }
+
+
+async def run(mode: str, args, proxies: list, tmp: str) -> dict:
+    path = os.path.join(tmp, f'{mode}.snapshot')
+    index = ProxyIndex(seed=0)
+    index.rebuild(proxies)
+    index.take_changes()
+    generation = write_snapshot(path, index.dump())
+    follower = ProxyIndex(seed=0)
+    follower.restore(read_snapshot(path))
+    offset = 0
+
+    async def leader():
+        if mode == 'on_loop':
+            await asyncio.to_thread(write_snapshot, path, _dump_on_loop(index))
+        elif mode == 'threaded':
+            await asyncio.to_thread(lambda: write_snapshot(path, index.dump()))
+        else:
+            await asyncio.to_thread(append_journal, path, index.take_changes())
+
+    async def follow():
+        nonlocal offset
+        if mode == 'on_loop':
+            records = await asyncio.to_thread(read_snapshot, path)
+            _restore_on_loop(follower, records)
+        elif mode == 'threaded':
+            await asyncio.to_thread(lambda: follower.restore(read_snapshot_with_header(path)[1]))
+        else:
+            records, offset = await asyncio.to_thread(read_journal, path, generation, offset)
+            await asyncio.to_thread(follower.apply_changes, records)
+
+    write_gaps, reload_gaps = [], []
+    write_seconds = reload_seconds = 0.0
+    for round_ in range(args.rounds):
+        for i in range(args.changes):
+            proxy = proxies[(round_ * args.changes + i) * 7919 % len(proxies)]
+            proxy.score = (proxy.score * 1.7) % 10 + 0.1
+            index.update(proxy)
+        start = time.perf_counter()
+        await measure(leader, write_gaps)
+        write_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        await measure(follow, reload_gaps)
+        reload_seconds += time.perf_counter() - start
+    return {
+        'mode': mode,
+        'leader_write': summarize(write_gaps, write_seconds),
+        'follower_reload': summarize(reload_gaps, reload_seconds),
+        'consistent': index.dump() == follower.dump(),
+    }
+
+
+def _dump_on_loop(index: ProxyIndex) -> list:
+    # 修改前的做法：持锁在事件循环上构造全部记录
+    with index._lock:
+        return [[score, index._entries[key].checked, index._entries[key].data] for score, key in index._ranked]
+
+
+def _restore_on_loop(index: ProxyIndex, records: list):
+    # 修改前的做法：在事件循环上构造新状态
+    entries = {}
+    for score, checked, data in records:
+        entries[(data['host'], data['port'], data['protocol'])] = _Entry(score, data, 0, checked)
+    state = index._build(entries, list(index._lru))
+    with index._lock:
+        index._apply(state)
+
+
+async def main(args):
+    proxies = make_proxies(args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [await run(mode, args, proxies, tmp) for mode in ('on_loop', 'threaded', 'journal')]
+    print(json.dumps({'benchmark': 'snapshot', 'size': args.size, 'changes': args.changes,
+                      'rounds': args.rounds, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--changes', type=int, default=1000, help='每轮更新的代理数')
+    parser.add_argument('--rounds', type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""代理源调度基准：每轮抓取全部地址 vs 按产出调整各地址间隔和新代理的验证优先级
+
+离线模拟若干个特征不同的代理源(更新频率、每次新增数量、可用比例)，按5分钟一轮推进模拟时间，
+每轮只有固定的验证预算，记录验证次数、找到的可用代理，以及可用代理从出现在列表里到被验证的等待时间。抓取、间隔计算和验证排队都用的是 SourceTracker 和
+RevalidationScheduler 的实际实现，验证结果按各源的可用比例随机给出。
+
+用法: python -m benchmarks.bench_sources --hours 24 --budget 2000
+"""
+import argparse
+import json
+import random
+from app.core.candidate import ProxyCandidate
+from app.core.scheduler import RevalidationScheduler
+from app.core.sources import SourceTracker
+
+CYCLE = 300
+
+# 名称: (每隔几轮更新一次, 每次更新新增的代理数, 可用比例)；更新间隔为0表示只在第一次有内容
+SOURCES = {
+    'fresh': (1, 150, 0.3),
+    'hourly': (12, 600, 0.2),
+    'static': (0, 3000, 0.1),
+    'junk': (1, 1500, 0.01),
+    'stale_junk': (0, 5000, 0.002),
+    'broken': (None, 0, 0.0),
+}
+
+
+def simulate(mode: str, args) -> dict:
+    rng = random.Random(args.seed)
+    tracker = SourceTracker(base_interval=CYCLE)
+    scheduler = RevalidationScheduler()
+    lists = {name: [] for name in SOURCES}
+    # host -> 出现在列表里的模拟时间
+    listed_at = {}
+    waits = []
+    counter = 0
+    known = set()
+    fetches = checks = valid = 0
+    valid_by_source = dict.fromkeys(SOURCES, 0)
+    checks_by_source = dict.fromkeys(SOURCES, 0)
+
+    for cycle in range(int(args.hours * 3600 / CYCLE)):
+        now = cycle * CYCLE
+        # 各源按自己的节奏更新列表内容
+        for name, (every, size, _) in SOURCES.items():
+            if every is None or (every == 0 and cycle > 0) or (every and cycle % every):
+                continue
+            lists[name] = []
+            for _ in range(size):
+                counter += 1
+                host = f"10.{(counter >> 16) & 255}.{(counter >> 8) & 255}.{counter & 255}"
+                lists[name].append(host)
+                listed_at[host] = now
+
+        fresh = []
+        for name, hosts in lists.items():
+            if mode == 'adaptive' and not tracker.due(name, now):
+                continue
+            fetches += 1
+            status = 'error' if SOURCES[name][0] is None else 'ok'
+            tracker.record_fetch(name, name, status, 0.0, len(hosts), now=now)
+            for host in hosts:
+                if host not in known:
+                    known.add(host)
+                    fresh.append(ProxyCandidate(host, 8080, 'http', name, name))
+        tracker.record_new(fresh)
+        scheduler.add_new(fresh, now=now, delay=tracker.validation_delay if mode == 'adaptive' else None)
+
+        # 本轮的验证预算
+        for i, proxy in enumerate(scheduler.pop_due(args.budget, now=now + CYCLE)):
+            source = proxy.source
+            proxy.is_valid = rng.random() < SOURCES[source][2]
+            tracker.record_check(proxy)
+            scheduler.discard(proxy)
+            checks += 1
+            checks_by_source[source] += 1
+            if proxy.is_valid:
+                valid += 1
+                valid_by_source[source] += 1
+                # 预算在本轮内均匀用完
+                waits.append(now + i * CYCLE / args.budget - listed_at[proxy.host])
+
+    waits.sort()
+    intervals = {name: round(item['urls'][0]['interval']) for name, item in tracker.stats(now).items()}
+    return {
+        'mode': mode,
+        'fetches': fetches,
+        'checks': checks,
+        'valid_found': valid,
+        'valid_per_1000_checks': round(valid * 1000 / checks, 1) if checks else 0,
+        'valid_wait_p50': round(waits[len(waits) // 2]) if waits else None,
+        'valid_wait_p90': round(waits[int(len(waits) * 0.9)]) if waits else None,
+        'backlog': len(scheduler),
+        'checks_by_source': checks_by_source,
+        'valid_by_source': valid_by_source,
+        'final_intervals': intervals if mode == 'adaptive' else None,
+    }
+
+
+def main(args):
+    results = [simulate(mode, args) for mode in ('fixed', 'adaptive')]
+    print(json.dumps({'benchmark': 'sources', 'hours': args.hours, 'budget': args.budget,
+                      'sources': SOURCES, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--budget', type=int, default=2000, help='每轮(5分钟)最多验证的代理数')
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
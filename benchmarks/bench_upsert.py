@@ -0,0 +1,137 @@
+"""写库基准：逐行SELECT/merge 与 批量 INSERT ... ON CONFLICT DO UPDATE 的 rows/second
+
+旧写法在没有唯一索引的表上每行一次全表扫描，规模一大就跑不完，
+因此给它设了时间预算，超出预算后按已完成的行数计算速率并标记 truncated。
+
+用法: python -m benchmarks.bench_upsert --sizes 10000 100000 500000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import select, text
+from app.core.models import Proxy
+from app.core.pool import ProxyPool
+
+
+def make_proxies(count: int) -> list:
+    now = datetime.utcnow()
+    return [
+        Proxy(host=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", port=8000 + i % 1000,
+              protocol='http', source='bench', last_check=now, response_time=0.5,
+              is_valid=True, fail_count=0)
+        for i in range(count)
+    ]
+
+
+def legacy_add(pool: ProxyPool, proxies: list, budget: float):
+    # 旧 add_proxies：每个代理一次SELECT判断是否存在
+    db = pool.SessionLocal()
+    start = time.perf_counter()
+    done = 0
+    try:
+        for proxy in proxies:
+            stmt = select(Proxy).where(
+                Proxy.host == proxy.host,
+                Proxy.port == proxy.port,
+                Proxy.protocol == proxy.protocol
+            )
+            if not db.execute(stmt).scalar():
+                db.add(proxy)
+            done += 1
+            if time.perf_counter() - start > budget:
+                break
+        db.commit()
+    finally:
+        db.close()
+    return done, time.perf_counter() - start
+
+
+def legacy_writeback(pool: ProxyPool, budget: float):
+    # 旧 refresh_proxies 写回：逐行 db.merge
+    db = pool.SessionLocal()
+    try:
+        proxies = pool.get_all_proxies(db, valid_only=False)
+        db.expunge_all()
+        start = time.perf_counter()
+        done = 0
+        for proxy in proxies:
+            proxy.fail_count = 1
+            db.merge(proxy)
+            done += 1
+            if time.perf_counter() - start > budget:
+                break
+        db.commit()
+        return done, time.perf_counter() - start
+    finally:
+        db.close()
+
+
+def bulk_add(pool: ProxyPool, proxies: list):
+    db = pool.SessionLocal()
+    try:
+        start = time.perf_counter()
+        pool.upsert_proxies(proxies, db)
+        return len(proxies), time.perf_counter() - start
+    finally:
+        db.close()
+
+
+def bulk_writeback(pool: ProxyPool):
+    db = pool.SessionLocal()
+    try:
+        proxies = pool.get_all_proxies(db, valid_only=False)
+        db.expunge_all()
+        start = time.perf_counter()
+        for proxy in proxies:
+            proxy.fail_count = 1
+        pool.upsert_proxies(proxies, db)
+        return len(proxies), time.perf_counter() - start
+    finally:
+        db.close()
+
+
+def result(mode: str, phase: str, size: int, done: int, elapsed: float) -> dict:
+    return {
+        'mode': mode,
+        'phase': phase,
+        'size': size,
+        'rows': done,
+        'truncated': done < size,
+        'elapsed': round(elapsed, 3),
+        'rows_per_second': round(done / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(args):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            proxies = make_proxies(size)
+
+            pool = ProxyPool(db_url=f"sqlite:///{os.path.join(tmp, f'legacy_{size}.db')}", data_dir=tmp)
+            db = pool.SessionLocal()
+            # 还原旧表结构：没有唯一索引
+            db.execute(text("DROP INDEX ux_proxies_endpoint"))
+            db.commit()
+            db.close()
+            done, elapsed = legacy_add(pool, proxies, args.budget)
+            results.append(result('legacy', 'insert', size, done, elapsed))
+            done, elapsed = legacy_writeback(pool, args.budget)
+            results.append(result('legacy', 'writeback', size, done, elapsed))
+
+            pool = ProxyPool(db_url=f"sqlite:///{os.path.join(tmp, f'bulk_{size}.db')}", data_dir=tmp)
+            done, elapsed = bulk_add(pool, make_proxies(size))
+            results.append(result('bulk', 'insert', size, done, elapsed))
+            done, elapsed = bulk_writeback(pool)
+            results.append(result('bulk', 'writeback', size, done, elapsed))
+    print(json.dumps({'benchmark': 'upsert', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--budget', type=float, default=30.0, help='旧写法每个阶段的时间预算(秒)')
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+"""验证器吞吐基准：对比每次验证新建会话与共享连接池两种方式的 checks/second
+
+用法: python -m benchmarks.bench_validator --checks 5000 --proxies 50 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import time
+import aiohttp
+from app.core.models import Proxy
+from app.core.validator import ProxyValidator
+from .standins import spawn_standins
+
+
+async def legacy_validate(validator: ProxyValidator, proxy: Proxy):
+    # 旧实现：每次验证都新建 ClientSession
+    start_time = time.time()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                validator.test_url,
+                proxy=proxy.url,
+                timeout=aiohttp.ClientTimeout(total=validator.timeout),
+                ssl=False
+            ) as response:
+                if response.status == 200:
+                    return True, time.time() - start_time
+                return False, None
+    except Exception:
+        return False, None
+
+
+async def run_mode(mode: str, validator: ProxyValidator, proxies: list, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    check = validator.validate_proxy if mode == 'shared' else (
+        lambda p: legacy_validate(validator, p))
+
+    async def one(proxy):
+        async with semaphore:
+            return await check(proxy)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = await asyncio.gather(*(one(p) for p in proxies))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    ok = sum(1 for valid, _ in results if valid)
+    return {
+        'mode': mode,
+        'checks': len(proxies),
+        'ok': ok,
+        'elapsed': round(elapsed, 3),
+        'checks_per_second': round(len(proxies) / elapsed, 1),
+        # 本进程(客户端)每次验证消耗的CPU时间，替身服务在独立进程中不计入
+        'cpu_ms_per_check': round(cpu * 1000 / len(proxies), 3),
+    }
+
+
+async def main(args):
+    process, target_url, ports, _ = spawn_standins(args.proxies, latency=args.latency)
+    proxies = [
+        Proxy(host='127.0.0.1', port=ports[i % len(ports)], protocol='http')
+        for i in range(args.checks)
+    ]
+    results = []
+    try:
+        for mode in ('legacy', 'shared'):
+            validator = ProxyValidator(timeout=args.timeout, test_url=target_url)
+            try:
+                results.append(await run_mode(mode, validator, proxies, args.concurrency))
+            finally:
+                await validator.close()
+    finally:
+        process.terminate()
+    print(json.dumps({'benchmark': 'validator', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checks', type=int, default=5000)
+    parser.add_argument('--proxies', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--timeout', type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
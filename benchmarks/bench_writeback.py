@@ -0,0 +1,104 @@
+"""大批量写回期间的 /proxy 接口延迟：在事件循环上直接写库 vs 专用数据库线程
+
+写回和接口请求跑在同一个事件循环里，和线上后台任务与FastAPI共用一个循环的情况一致。
+专用数据库线程模式下写回期间的 p99 超过 --max-p99 时以非零状态退出，python -m benchmarks 会把它记为失败。
+
+用法: python -m benchmarks.bench_writeback --rows 200000 --batch 1000 --requests 2000 --max-p99 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+import httpx
+from .bench_api import percentile
+from .standins import run_in_tempdir
+
+
+async def write_back(pool, proxies: list, batch_size: int, mode: str):
+    for i in range(0, len(proxies), batch_size):
+        batch = proxies[i:i + batch_size]
+        if mode == 'inline':
+            # 旧实现：async方法里直接调用同步SQLAlchemy
+            db = pool.SessionLocal()
+            try:
+                pool.upsert_proxies(batch, db)
+            finally:
+                db.close()
+            await asyncio.sleep(0)
+        else:
+            await pool.run_db(lambda db: pool.upsert_proxies(batch, db))
+
+
+async def measure(client: httpx.AsyncClient, done: asyncio.Event, min_requests: int,
+                  interval: float = 0.005) -> dict:
+    # 按固定节奏发请求，延迟从计划发出时间算起：事件循环被卡住时，排队等待的时间也计入
+    latencies = []
+    scheduled = time.perf_counter()
+    while not done.is_set() or len(latencies) < min_requests:
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.get('/proxy')
+        latencies.append(time.perf_counter() - scheduled)
+        response.raise_for_status()
+        scheduled += interval
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+async def main(args):
+    from app.core.models import Proxy
+    from app.core.pool import ProxyPool
+    import app.api.main as api
+
+    pool = ProxyPool(db_url=f"sqlite:///{os.path.join(args.tmp, 'bench.db')}")
+    rng = random.Random(0)
+    proxies = [
+        Proxy(host=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", port=8080, protocol='http',
+              source='bench', response_time=rng.uniform(0.1, 5), is_valid=True, fail_count=0,
+              last_check=datetime.utcnow())
+        for i in range(args.rows)
+    ]
+    await pool.run_db(lambda db: pool.upsert_proxies(proxies[:1000], db))
+    pool.reload_index()
+    api.proxy_pool = pool
+
+    results = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for mode in ('idle', 'inline', 'executor'):
+            done = asyncio.Event()
+            start = time.perf_counter()
+            # 写回模式只统计写回期间的请求
+            probe = asyncio.create_task(measure(client, done, args.requests if mode == 'idle' else 1))
+            if mode == 'idle':
+                done.set()
+            else:
+                await write_back(pool, proxies, args.batch, mode)
+                done.set()
+            write_seconds = time.perf_counter() - start
+            result = await probe
+            results.append({'mode': mode, 'write_seconds': round(write_seconds, 3), **result})
+    await pool.close()
+    p99 = next(result['p99_ms'] for result in results if result['mode'] == 'executor')
+    passed = p99 <= args.max_p99
+    print(json.dumps({'benchmark': 'writeback', 'rows': args.rows, 'max_p99_ms': args.max_p99,
+                      'passed': passed, 'results': results}, indent=2))
+    if not passed:
+        sys.exit(f"写回期间 /proxy 的 p99 为 {p99}ms，超过上限 {args.max_p99}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--max-p99', type=float, default=100, help='写回期间 /proxy 的 p99 上限(毫秒)')
+    args = parser.parse_args()
+    run_in_tempdir(main, args)
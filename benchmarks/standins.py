@@ -0,0 +1,370 @@
+"""本地替身服务：用于离线基准测试的验证目标、代理列表服务和HTTP/SOCKS代理"""
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import tempfile
+from email.utils import formatdate
+from aiohttp import web
+
+
+def run_in_tempdir(main, args):
+    """在临时目录中执行 asyncio.run(main(args))，临时目录的路径放在 args.tmp
+
+    app.api.main 导入时会在当前目录创建 data/，切到临时目录避免污染仓库；切换前把仓库目录加入 sys.path。
+    """
+    cwd = os.getcwd()
+    sys.path.insert(0, cwd)
+    with tempfile.TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        os.chdir(tmp)
+        try:
+            asyncio.run(main(args))
+        finally:
+            os.chdir(cwd)
+
+
+async def start_target(host: str = '127.0.0.1', port: int = 0, body: bytes = b'ok'):
+    """启动一个返回固定内容的验证目标，返回 (runner, url)
+
+    /echo 按 httpbin 的格式回显来源地址和请求头，用作匿名度检测的回显地址。
+    """
+    async def handle(request):
+        if request.path == '/echo':
+            return web.json_response({'origin': request.remote, 'headers': dict(request.headers)})
+        return web.Response(body=body)
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/"
+
+
+def make_proxy_list(count: int, seed: int = 0) -> bytes:
+    """生成 count 行 ip:port 格式的代理列表"""
+    rng = random.Random(seed)
+    lines = [
+        f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}:{rng.randint(1, 65535)}"
+        for _ in range(count)
+    ]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+async def start_list_server(lists: dict, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+    """启动代理列表服务，lists 为 {路径: 内容}，支持 ETag/Last-Modified 条件请求
+
+    返回 (runner, base_url, counters)，counters 记录 200 和 304 的次数
+    """
+    last_modified = formatdate(usegmt=True)
+    etags = {path: '"%s"' % hashlib.md5(body).hexdigest() for path, body in lists.items()}
+    counters = {'200': 0, '304': 0}
+
+    async def handle(request):
+        path = request.path
+        if path not in lists:
+            return web.Response(status=404)
+        if latency:
+            await asyncio.sleep(latency)
+        if (request.headers.get('If-None-Match') == etags[path]
+                or request.headers.get('If-Modified-Since') == last_modified):
+            counters['304'] += 1
+            return web.Response(status=304)
+        counters['200'] += 1
+        return web.Response(body=lists[path], content_type='text/plain',
+                            headers={'ETag': etags[path], 'Last-Modified': last_modified})
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}", counters
+
+
+class StandinProxy:
+    """最小化的转发代理：HTTP(绝对路径GET和CONNECT隧道)、SOCKS4、SOCKS5
+
+    hang=True 时只接受连接不做任何响应，用来模拟超时的死代理。
+    也可以按连接随机注入故障：每个连接的延迟为 latency±jitter(正态分布)，
+    以 failure_rate 的概率直接拒绝(HTTP返回502，SOCKS断开)，以 timeout_rate 的概率不响应。
+    egress 为连接目标时绑定的本地地址(如 127.0.1.5)，模拟不同的出口IP；
+    anonymity 决定转发HTTP请求时加的头：transparent 加 Via 和带客户端地址的 X-Forwarded-For，
+    anonymous 只加 Via，elite 不加(隧道和SOCKS无法加头)。
+    """
+
+    def __init__(self, latency: float = 0.0, hang: bool = False, protocol: str = 'http',
+                 jitter: float = 0.0, failure_rate: float = 0.0, timeout_rate: float = 0.0,
+                 seed: int = None, egress: str = None, anonymity: str = 'elite'):
+        self.latency = latency
+        self.egress = egress
+        self.anonymity = anonymity
+        self.hang = hang
+        self.protocol = protocol
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self._random = random.Random(seed)
+        self.server = None
+        self.port = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _roll(self) -> tuple[str, float]:
+        # 决定本次连接的行为和延迟
+        roll = self._random.random()
+        if self.hang or roll < self.timeout_rate:
+            return 'hang', 0.0
+        if roll < self.timeout_rate + self.failure_rate:
+            return 'fail', 0.0
+        latency = self.latency
+        if self.jitter:
+            latency = max(0.0, self._random.gauss(latency, self.jitter))
+        return 'ok', latency
+
+    def _local_addr(self):
+        return (self.egress, 0) if self.egress else None
+
+    def _add_headers(self, head: bytes, writer) -> bytes:
+        if self.anonymity == 'elite':
+            return head
+        extra = b'Via: 1.1 standin\r\n'
+        if self.anonymity == 'transparent':
+            extra += f"X-Forwarded-For: {writer.get_extra_info('peername')[0]}\r\n".encode()
+        return head[:-2] + extra + b'\r\n'
+
+    async def _handle(self, reader, writer):
+        try:
+            behaviour, latency = self._roll()
+            if behaviour == 'hang':
+                await reader.read()
+                return
+            if self.protocol != 'http':
+                if latency:
+                    await asyncio.sleep(latency)
+                if behaviour == 'fail':
+                    return
+                handshake = _socks5_handshake if self.protocol == 'socks5' else _socks4_handshake
+                up_reader, up_writer = await handshake(reader, writer, self._local_addr())
+                await asyncio.gather(
+                    _pipe(reader, up_writer),
+                    _pipe(up_reader, writer),
+                )
+                return
+            head = await reader.readuntil(b'\r\n\r\n')
+            method, target, _ = head.split(b'\r\n', 1)[0].decode().split(' ', 2)
+            if latency:
+                await asyncio.sleep(latency)
+            if behaviour == 'fail':
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                await writer.drain()
+                return
+            if method == 'CONNECT':
+                host, port = target.rsplit(':', 1)
+                up_reader, up_writer = await asyncio.open_connection(host, int(port), local_addr=self._local_addr())
+                writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                await writer.drain()
+            else:
+                hostport = target.split('://', 1)[1].split('/', 1)[0]
+                host, _, port = hostport.partition(':')
+                up_reader, up_writer = await asyncio.open_connection(
+                    host, int(port or 80), local_addr=self._local_addr())
+                # 目标服务接受绝对路径形式的请求行，原样转发即可
+                up_writer.write(self._add_headers(head, writer))
+            await asyncio.gather(
+                _pipe(reader, up_writer),
+                _pipe(up_reader, writer),
+            )
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _socks5_handshake(reader, writer, local_addr=None):
+    _, nmethods = await reader.readexactly(2)
+    await reader.readexactly(nmethods)
+    writer.write(b'\x05\x00')
+    _, _, _, atyp = await reader.readexactly(4)
+    if atyp == 1:
+        host = '.'.join(str(b) for b in await reader.readexactly(4))
+    elif atyp == 3:
+        host = (await reader.readexactly((await reader.readexactly(1))[0])).decode()
+    else:
+        raise ValueError('unsupported address type')
+    port = int.from_bytes(await reader.readexactly(2), 'big')
+    upstream = await asyncio.open_connection(host, port, local_addr=local_addr)
+    writer.write(b'\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00')
+    await writer.drain()
+    return upstream
+
+
+async def _socks4_handshake(reader, writer, local_addr=None):
+    header = await reader.readexactly(8)
+    port = int.from_bytes(header[2:4], 'big')
+    ip = header[4:8]
+    await reader.readuntil(b'\x00')  # userid
+    if ip[:3] == b'\x00\x00\x00' and ip[3]:
+        # SOCKS4a：由代理解析域名
+        host = (await reader.readuntil(b'\x00'))[:-1].decode()
+    else:
+        host = '.'.join(str(b) for b in ip)
+    upstream = await asyncio.open_connection(host, port, local_addr=local_addr)
+    writer.write(b'\x00\x5a' + header[2:8])
+    await writer.drain()
+    return upstream
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+async def start_proxies(count: int, latency: float = 0.0, hang: bool = False, protocol: str = 'http'):
+    """启动一组本地代理，返回代理实例列表"""
+    proxies = []
+    for _ in range(count):
+        proxy = StandinProxy(latency=latency, hang=hang, protocol=protocol)
+        await proxy.start()
+        proxies.append(proxy)
+    return proxies
+
+
+def open_blackholes(count: int, host: str = '127.0.0.1') -> list:
+    """打开一组只监听不accept、且积压队列已满的端口
+
+    之后的连接请求会被内核丢弃，客户端的TCP连接会一直等到超时，模拟不可达的死代理。
+    返回 (监听socket, 填充连接) 列表，需保持引用直到测试结束。
+    """
+    import socket
+    holes = []
+    for _ in range(count):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind((host, 0))
+        server.listen(0)
+        fillers = []
+        # 填满积压队列
+        for _ in range(2):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(False)
+            filler.connect_ex(server.getsockname())
+            fillers.append(filler)
+        holes.append((server, fillers))
+    return holes
+
+
+def closed_ports(count: int, host: str = '127.0.0.1') -> list:
+    """分配一组随即关闭的端口，连接会被立即拒绝，模拟已下线的代理"""
+    import socket
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((host, 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def _serve_fleet(conn, groups: list, refused: int, blackholes: int, list_latency: float):
+    async def serve():
+        runner, target_url = await start_target()
+        fleet = []
+        lines = {}
+        for i, group in enumerate(groups):
+            spec = dict(group)
+            count = spec.pop('count')
+            protocol = spec.get('protocol', 'http')
+            # 组内代理轮流使用 egress_ips 个出口地址(127.0.<组号+1>.x)
+            egress_ips = spec.pop('egress_ips', 0)
+            proxies = []
+            for j in range(count):
+                egress = f"127.0.{i + 1}.{j % egress_ips + 1}" if egress_ips else None
+                proxy = StandinProxy(seed=i * 100003 + j, egress=egress, **spec)
+                await proxy.start()
+                proxies.append(proxy)
+            fleet.append([proxy.port for proxy in proxies])
+            lines.setdefault(protocol, []).extend(f"127.0.0.1:{proxy.port}" for proxy in proxies)
+        # 列表里混入连接被拒绝和连接超时的死代理
+        holes = open_blackholes(blackholes)
+        dead = [f"127.0.0.1:{port}" for port in closed_ports(refused)]
+        dead += [f"127.0.0.1:{server.getsockname()[1]}" for server, _ in holes]
+        lines.setdefault('http', []).extend(dead)
+        lists = {f"/{protocol}.txt": ('\n'.join(entries) + '\n').encode() for protocol, entries in lines.items()}
+        list_runner, list_url, counters = await start_list_server(lists, latency=list_latency)
+        paths = {path[1:-4]: f"{list_url}{path}" for path in lists}
+        conn.send((target_url, paths, fleet))
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def spawn_fleet(groups: list, refused: int = 0, blackholes: int = 0, list_latency: float = 0.0):
+    """在独立进程中启动验证目标、一组可编程的代理和列出这些代理的列表服务
+
+    groups 为代理分组，每组是 StandinProxy 的参数加上 count，例如
+    {'count': 50, 'protocol': 'socks5', 'latency': 0.1, 'jitter': 0.05, 'failure_rate': 0.1}，
+    另外可以用 egress_ips 指定组内代理共用几个出口地址。
+    列表按协议分文件(/http.txt、/socks5.txt ...)，http列表额外混入 refused 个拒绝连接
+    和 blackholes 个连接超时的地址。
+    返回 (process, target_url, {协议: 列表地址}, 每组的端口列表)，用完后调用 process.terminate()
+    """
+    import multiprocessing
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve_fleet, args=(child_conn, groups, refused, blackholes, list_latency), daemon=True)
+    process.start()
+    target_url, lists, fleet = parent_conn.recv()
+    return process, target_url, lists, fleet
+
+
+def _serve_forever(conn, proxy_count: int, latency: float, dead_count: int):
+    async def serve():
+        runner, target_url = await start_target()
+        proxies = await start_proxies(proxy_count, latency=latency)
+        dead = await start_proxies(dead_count, hang=True)
+        conn.send((target_url, [p.port for p in proxies], [p.port for p in dead]))
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def spawn_standins(proxy_count: int, latency: float = 0.0, dead_count: int = 0):
+    """在独立进程中启动验证目标和代理，避免与被测代码争抢事件循环
+
+    返回 (process, target_url, proxy_ports, dead_ports)，用完后调用 process.terminate()
+    """
+    import multiprocessing
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve_forever, args=(child_conn, proxy_count, latency, dead_count), daemon=True)
+    process.start()
+    target_url, ports, dead_ports = parent_conn.recv()
+    return process, target_url, ports, dead_ports
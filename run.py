@@ -1,4 +1,17 @@
+import argparse
+import os
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("app.api.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="启动代理池服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("PROXY_POOL_WORKERS", 1)),
+                        help="API进程数，只有其中一个进程负责爬取和验证")
+    parser.add_argument("--reload", action="store_true", help="开发模式：代码变更时自动重启，只能单进程")
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run("app.api.main:app", host=args.host, port=args.port, reload=True)
+    else:
+        uvicorn.run("app.api.main:app", host=args.host, port=args.port, workers=args.workers)